@@ -1,58 +1,34 @@
 import os
 from typing import Dict, Any
-import cv2
-import numpy as np
-from PIL import Image
-from io import BytesIO
 import tempfile
+from functools import lru_cache
 import firebase_functions as functions
 from firebase_admin import initialize_app, storage, firestore
+from google.cloud.storage.retry import DEFAULT_RETRY
 import logging
-from python.image_analyzer.image_analyzer.main import analyze_image
+
+from python.thumbnail_generator.thumbnail_generator.frames import (
+    generate_thumbnail, video_temp_dir)
 
 # Initialize Firebase Admin
 initialize_app()
 
+# Thumbnail upload deadline; uploads are retried on transient errors
+UPLOAD_TIMEOUT = 30  # seconds
+# Thumbnails are rewritten in place on reprocessing, so keep caches short
+THUMBNAIL_CACHE_CONTROL = 'public, max-age=86400'
 
-def extract_dimensions_from_video(video_path: str) -> Dict[str, int]:
-    """Extract width and height from video file."""
-    try:
-        cap = cv2.VideoCapture(video_path)
-        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-        fps = int(cap.get(cv2.CAP_PROP_FPS))
-        cap.release()
-        return {"width": width, "height": height, "fps": fps}
-    except Exception as e:
-        logging.error(f"Error extracting dimensions: {str(e)}")
-        return {}
 
+@lru_cache(maxsize=1)
+def _bucket():
+    """Return the shared default storage bucket handle."""
+    return storage.bucket()
 
-def generate_thumbnail(video_path: str) -> bytes:
-    """Generate thumbnail from video file."""
-    try:
-        cap = cv2.VideoCapture(video_path)
-
-        # Read first frame
-        success, frame = cap.read()
-        if not success:
-            raise ValueError("Could not read video frame")
 
-        # Convert BGR to RGB
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-
-        # Convert to PIL Image
-        image = Image.fromarray(rgb_frame)
-
-        # Save to bytes
-        img_byte_arr = BytesIO()
-        image.save(img_byte_arr, format='JPEG', quality=85)
-
-        cap.release()
-        return img_byte_arr.getvalue()
-    except Exception as e:
-        logging.error(f"Error generating thumbnail: {str(e)}")
-        raise
+@lru_cache(maxsize=1)
+def _db():
+    """Return the shared Firestore client."""
+    return firestore.client()
 
 
 @functions.on_call()
@@ -68,37 +44,40 @@ def generate_video_thumbnail(request: functions.CallableRequest) -> Dict[str, An
         video_id = os.path.splitext(os.path.basename(video_path))[0]
 
         # Get video from storage
-        bucket = storage.bucket()
+        bucket = _bucket()
         video_blob = bucket.blob(video_path)
 
         if not video_blob.exists():
             return {"error": "Video not found"}
 
         # Download to temp file
-        _, temp_local_filename = tempfile.mkstemp()
+        fd, temp_local_filename = tempfile.mkstemp(dir=video_temp_dir())
+        os.close(fd)
         video_blob.download_to_filename(temp_local_filename)
 
         try:
-            # Extract dimensions
-            dimensions = extract_dimensions_from_video(temp_local_filename)
+            # Generate thumbnail and extract dimensions
+            dimensions, thumbnail_data = generate_thumbnail(temp_local_filename)
 
-            # Generate thumbnail
-            thumbnail_data = generate_thumbnail(temp_local_filename)
-
-            # Upload thumbnail
             thumbnail_path = f"thumbnails/{video_id}.jpg"
             thumbnail_blob = bucket.blob(thumbnail_path)
-            thumbnail_blob.upload_from_string(
-                thumbnail_data,
-                content_type='image/jpeg'
-            )
+            thumbnail_blob.cache_control = THUMBNAIL_CACHE_CONTROL
 
             # Get thumbnail URL
             thumbnail_url = f"gs://{bucket.name}/{thumbnail_path}"
 
-            # Update video metadata in Firestore
+            # Upload the thumbnail first, so the document is only marked
+            # completed once the file it points at exists
+            thumbnail_blob.upload_from_string(
+                thumbnail_data,
+                content_type='image/jpeg',
+                timeout=UPLOAD_TIMEOUT,
+                retry=DEFAULT_RETRY,
+                checksum='crc32c'
+            )
+
             if dimensions:
-                db = firestore.client()
+                db = _db()
                 video_ref = db.collection('videos').document(video_id)
                 video_ref.update({
                     'metadata': {
@@ -131,7 +110,7 @@ def generate_video_thumbnail(request: functions.CallableRequest) -> Dict[str, An
 
         # Update error status in Firestore
         try:
-            db = firestore.client()
+            db = _db()
             video_ref = db.collection('videos').document(video_id)
             video_ref.update({
                 'processingStatus': 'failed',
@@ -153,6 +132,9 @@ def analyze_screenshot(request: functions.CallableRequest) -> Dict[str, Any]:
         if not image_data:
             raise ValueError('No image data provided')
 
+        # Imported on first use so thumbnail cold starts skip the analyzer's
+        # OpenAI and Firebase setup
+        from python.image_analyzer.image_analyzer.main import analyze_image
         return analyze_image(image_data)
     except Exception as e:
         logging.error(f"Error in analyze_screenshot: {str(e)}")
@@ -1,5 +1,6 @@
 """Firebase configuration module."""
 import os
+from functools import lru_cache
 from typing import Optional
 from dotenv import load_dotenv
 import firebase_admin
@@ -25,11 +26,13 @@ def initialize() -> None:
         })
 
 
+@lru_cache(maxsize=1)
 def get_storage_bucket() -> storage.bucket.Bucket:
     """Get the Firebase Storage bucket instance."""
     return storage.bucket()
 
 
+@lru_cache(maxsize=1)
 def get_firestore_client() -> firestore.Client:
     """Get the Firestore client instance."""
     return firestore.client()
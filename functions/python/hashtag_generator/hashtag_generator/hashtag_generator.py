@@ -1,17 +1,20 @@
 """Module for generating hashtags from video content using OpenAI."""
 
 import os
-import cv2
+import re
+import queue
 import base64
 import logging
-from typing import List, Dict, Any
+import subprocess
+from functools import lru_cache
+from typing import List, Dict, Any, Optional
 import tempfile
+import httpx
 from openai import OpenAI
 from datetime import datetime
 import firebase_admin
 from firebase_admin import storage, firestore
-from concurrent.futures import ThreadPoolExecutor, as_completed
-import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 import json
 from .config import firebase_config
 
@@ -21,24 +24,165 @@ logger = logging.getLogger(__name__)
 MAX_IMAGE_SIZE = 384  # Reduced from 512 to save memory
 JPEG_QUALITY = 60    # Reduced from 80 to save memory
 MAX_WORKERS = 3      # Reduced from 5 to save memory
+DOWNLOAD_WORKERS = 4  # Dedicated threads prefetching videos from Storage
+PREFETCH_DEPTH = MAX_WORKERS * 2  # Downloaded videos waiting for a worker
 
+# Server-side filter so only video files are listed at all
+VIDEO_MATCH_GLOB = "**.{[mM][pP]4,[mM][oO][vV],[aA][vV][iI]}"
+# Video blobs outside the generated-asset directories
+_VIDEO_RE = re.compile(
+    r"^(?!thumbnails/|metadata/).+\.(?:mp4|mov|avi)$", re.IGNORECASE)
+
+# Firestore batching limits
+GET_ALL_CHUNK_SIZE = 300  # Documents per get_all request
+WRITE_BATCH_SIZE = 500    # Maximum operations per WriteBatch
+
+# Shared OpenAI connection pool, sized well above MAX_WORKERS
+OPENAI_MAX_CONNECTIONS = 64
+OPENAI_MAX_KEEPALIVE = 32
+
+# ffmpeg decodes and downscales the sampled frame in one process
+FFMPEG_BINARY = os.getenv('FFMPEG_BINARY', 'ffmpeg')
+FFPROBE_BINARY = os.getenv('FFPROBE_BINARY', 'ffprobe')
+FFMPEG_TIMEOUT = 60   # seconds
+FFMPEG_JPEG_QSCALE = 6  # mjpeg qscale (2-31), roughly JPEG_QUALITY
+# Fit the frame inside MAX_IMAGE_SIZE x MAX_IMAGE_SIZE without upscaling
+FRAME_SCALE_FILTER = (
+    f"scale='min({MAX_IMAGE_SIZE},iw)':'min({MAX_IMAGE_SIZE},ih)'"
+    ":force_original_aspect_ratio=decrease"
+)
+
+
+def _chunks(items: List[Any], size: int):
+    """Yield successive slices of at most size items."""
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+@lru_cache(maxsize=1)
+def _bucket():
+    """Return the shared default storage bucket handle."""
+    return storage.bucket()
+
+
+@lru_cache(maxsize=1)
+def _db():
+    """Return the shared Firestore client."""
+    return firestore.client()
+
+
+@lru_cache(maxsize=1)
+def _openai() -> OpenAI:
+    """Return the shared OpenAI client; it is safe to use across threads."""
+    return OpenAI(
+        api_key=os.getenv('OPENAI_API_KEY'),
+        http_client=httpx.Client(limits=httpx.Limits(
+            max_connections=OPENAI_MAX_CONNECTIONS,
+            max_keepalive_connections=OPENAI_MAX_KEEPALIVE)))
+
+
+def _probe_duration_cv2(video_path: str) -> float:
+    """Return the duration from OpenCV's frame count and rate, or 0."""
+    # Imported on first use so the ffmpeg path never loads OpenCV
+    import cv2
+
+    cap = cv2.VideoCapture(video_path)
+    try:
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        frame_count = cap.get(cv2.CAP_PROP_FRAME_COUNT)
+        return frame_count / fps if fps and frame_count > 0 else 0.0
+    finally:
+        cap.release()
+
+
+def _extract_middle_frame_cv2(video_path: str) -> bytes:
+    """Decode, downscale and encode the middle frame with OpenCV.
+
+    Used when ffmpeg is missing or cannot read the video, e.g. where only
+    imageio-ffmpeg is installed and there is no ffprobe.
+    """
+    import cv2
+
+    cap = cv2.VideoCapture(video_path)
+    try:
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        cap.set(cv2.CAP_PROP_POS_FRAMES, total_frames // 2)
+        success, frame = cap.read()
+    finally:
+        cap.release()
+    if not success:
+        logger.error("OpenCV could not read the middle frame")
+        return b''
 
-def resize_image(frame: np.ndarray) -> np.ndarray:
-    """Resize image while maintaining aspect ratio."""
     height, width = frame.shape[:2]
     if height > MAX_IMAGE_SIZE or width > MAX_IMAGE_SIZE:
         scale = MAX_IMAGE_SIZE / max(height, width)
-        new_width = int(width * scale)
-        new_height = int(height * scale)
-        return cv2.resize(frame, (new_width, new_height), interpolation=cv2.INTER_AREA)
-    return frame
+        frame = cv2.resize(frame, (int(width * scale), int(height * scale)),
+                           interpolation=cv2.INTER_AREA)
+    success, buffer = cv2.imencode(
+        '.jpg', frame, [int(cv2.IMWRITE_JPEG_QUALITY), JPEG_QUALITY])
+    return buffer.tobytes() if success else b''
+
 
+def probe_duration(video_path: str) -> float:
+    """Return the container duration in seconds, or 0 when it is unknown.
 
-def process_single_video(video_data: Dict[str, Any]) -> Dict[str, Any]:
-    """Process a single video in a separate thread."""
+    Falls back to OpenCV when ffprobe is missing or does not finish.
+    """
+    try:
+        result = subprocess.run(
+            [FFPROBE_BINARY, '-v', 'error', '-show_entries', 'format=duration',
+             '-of', 'csv=p=0', video_path],
+            capture_output=True, text=True, timeout=FFMPEG_TIMEOUT)
+    except (OSError, subprocess.SubprocessError) as e:
+        logger.warning(f"ffprobe failed, reading the duration with OpenCV: {str(e)}")
+        return _probe_duration_cv2(video_path)
     try:
-        with HashtagGenerator(video_data['id'], video_data) as generator:
-            return generator.process()
+        return float(result.stdout.strip())
+    except ValueError:
+        return 0.0
+
+
+def extract_middle_frame(video_path: str) -> bytes:
+    """Decode one JPEG frame from the middle of the video at MAX_IMAGE_SIZE.
+
+    The scale filter runs inside the decoder pipeline, so the frame never
+    reaches Python at source resolution, and only the keyframe at the seek
+    point is decoded. OpenCV decodes the frame when ffmpeg is missing or
+    fails.
+    """
+    try:
+        seek_seconds = probe_duration(video_path) / 2
+        result = subprocess.run(
+            [FFMPEG_BINARY, '-v', 'error',
+             '-skip_frame', 'nokey', '-noaccurate_seek',
+             '-ss', f"{seek_seconds:.3f}", '-i', video_path,
+             '-frames:v', '1', '-vf', FRAME_SCALE_FILTER,
+             '-q:v', str(FFMPEG_JPEG_QSCALE),
+             '-f', 'image2pipe', '-vcodec', 'mjpeg', 'pipe:1'],
+            capture_output=True, timeout=FFMPEG_TIMEOUT)
+    except (OSError, subprocess.SubprocessError) as e:
+        logger.warning(f"ffmpeg unavailable, using OpenCV: {str(e)}")
+        return _extract_middle_frame_cv2(video_path)
+    if result.returncode != 0 or not result.stdout:
+        logger.warning(
+            f"ffmpeg frame extraction failed, using OpenCV: {result.stderr.decode(errors='replace').strip()}")
+        return _extract_middle_frame_cv2(video_path)
+    return result.stdout
+
+
+def process_single_video(video_data: Dict[str, Any], save: bool = True,
+                         video_path: Optional[str] = None) -> Dict[str, Any]:
+    """Process a single video in a separate thread.
+
+    Args:
+        save: If False, return the generated content without writing it so
+            the caller can batch the Firestore updates
+        video_path: Already downloaded copy of the video, if any
+    """
+    try:
+        generator = HashtagGenerator(video_data['id'], video_data)
+        return generator.process(save=save, video_path=video_path)
     except Exception as e:
         logger.error(f"Error processing video {video_data['id']}: {str(e)}")
         return {
@@ -59,46 +203,58 @@ def get_videos_without_content(force: bool = False) -> List[Dict[str, Any]]:
         if not firebase_admin._apps:
             firebase_config.initialize()
 
-        storage_client = storage.bucket()
-        db = firestore.client()
+        storage_client = _bucket()
+        db = _db()
 
         # List all files in storage root
         logger.info("Listing blobs in storage root")
-        blobs = list(storage_client.list_blobs())
-        logger.info(f"Found {len(blobs)} total blobs in storage")
+        blobs = list(storage_client.list_blobs(match_glob=VIDEO_MATCH_GLOB))
+        logger.info(f"Found {len(blobs)} video blobs in storage")
 
         videos_needing_content = []
         videos_collection = db.collection('videos')
 
+        video_blobs = []
         for blob in blobs:
-            logger.info(f"Processing blob: {blob.name}")
-
-            # Skip thumbnails directory and non-video files
-            if (blob.name.startswith('thumbnails/') or
-                blob.name.startswith('metadata/') or
-                    not blob.name.lower().endswith(('.mp4', '.mov', '.avi'))):
-                logger.info(
-                    f"Skipping non-video file or directory: {blob.name}")
+            # Skip generated-asset directories and non-video files
+            if not _VIDEO_RE.match(blob.name):
+                logger.debug(
+                    "Skipping non-video file or directory: %s", blob.name)
                 continue
 
             video_id = os.path.splitext(os.path.basename(blob.name))[0]
-
-            # Get or create video document in Firestore
-            video_ref = videos_collection.document(video_id)
-            video_doc = video_ref.get()
-
-            if not video_doc.exists:
-                # Create new video document if it doesn't exist
-                video_ref.set({
+            video_blobs.append((video_id, blob.name))
+
+        # Fetch every video document in a few batched reads
+        refs = [videos_collection.document(video_id)
+                for video_id in dict.fromkeys(v for v, _ in video_blobs)]
+        video_docs = {}
+        for chunk in _chunks(refs, GET_ALL_CHUNK_SIZE):
+            for snapshot in db.get_all(chunk):
+                if snapshot.exists:
+                    video_docs[snapshot.id] = snapshot.to_dict()
+
+        # Create documents for storage-only videos in batched commits
+        new_documents = {}
+        for video_id, blob_name in video_blobs:
+            if video_id not in video_docs and video_id not in new_documents:
+                new_documents[video_id] = {
                     'id': video_id,
-                    'storagePath': blob.name,
+                    'storagePath': blob_name,
                     'createdAt': firestore.SERVER_TIMESTAMP,
                     'hasContent': False
-                })
+                }
+        for chunk in _chunks(list(new_documents.items()), WRITE_BATCH_SIZE):
+            batch = db.batch()
+            for video_id, data in chunk:
+                batch.set(videos_collection.document(video_id), data)
+            batch.commit()
+            for video_id, data in chunk:
                 logger.info(f"Created new video document for: {video_id}")
-                video_doc = video_ref.get()  # Refresh document
+                video_docs[video_id] = data
 
-            video_data = video_doc.to_dict()
+        for video_id, blob_name in video_blobs:
+            video_data = video_docs[video_id]
 
             # If force is True, add all videos
             if force:
@@ -106,7 +262,7 @@ def get_videos_without_content(force: bool = False) -> List[Dict[str, Any]]:
                     f"Force adding video for content generation: {video_id}")
                 videos_needing_content.append({
                     'id': video_id,
-                    'storagePath': blob.name
+                    'storagePath': blob_name
                 })
                 continue
 
@@ -124,7 +280,7 @@ def get_videos_without_content(force: bool = False) -> List[Dict[str, Any]]:
                     f"No meaningful content found for video: {video_id}")
                 videos_needing_content.append({
                     'id': video_id,
-                    'storagePath': blob.name
+                    'storagePath': blob_name
                 })
             else:
                 logger.info(f"Content already exists for video: {video_id}")
@@ -138,19 +294,57 @@ def get_videos_without_content(force: bool = False) -> List[Dict[str, Any]]:
         return []
 
 
+def _content_update(content: Dict[str, Any]) -> Dict[str, Any]:
+    """Build the Firestore update for generated video content."""
+    return {
+        'title': content.get('title', 'Untitled Video'),
+        'description': content.get('description', ''),
+        'metadata': {
+            'hashtags': content.get('hashtags', [])
+        },
+        'hasContent': True,
+        'updatedAt': firestore.SERVER_TIMESTAMP
+    }
+
+
+def _save_results(results: List[Dict[str, Any]]) -> None:
+    """Write generated content for successful results in batched commits.
+
+    Results whose batch fails to commit are marked as failed in place.
+    """
+    successful = [r for r in results if r.get('success', False)]
+    if not successful:
+        return
+
+    db = _db()
+    videos_collection = db.collection('videos')
+
+    for chunk in _chunks(successful, WRITE_BATCH_SIZE):
+        batch = db.batch()
+        for result in chunk:
+            batch.update(videos_collection.document(result['videoId']),
+                         _content_update({
+                             'title': result['title'],
+                             'description': result['description'],
+                             'hashtags': result['metadata']['hashtags']
+                         }))
+        try:
+            batch.commit()
+            logger.info(f"Saved content for {len(chunk)} videos to Firestore")
+        except Exception as e:
+            logger.error(f"Error saving content batch: {str(e)}")
+            for result in chunk:
+                result['success'] = False
+                result['error'] = str(e)
+
+
 class HashtagGenerator:
     def __init__(self, video_id: str, video_data: Dict[str, Any]):
         self.video_id = video_id
         self.video_data = video_data
-        self.storage_client = storage.bucket()
-        self.openai_client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
-        self.db = firestore.client()
-
-    def __enter__(self):
-        return self
-
-    def __exit__(self, exc_type, exc_val, exc_tb):
-        pass
+        self.storage_client = _bucket()
+        self.openai_client = _openai()
+        self.db = _db()
 
     def _download_video(self) -> str:
         """Download video to temporary file."""
@@ -159,54 +353,28 @@ class HashtagGenerator:
 
         # Create temporary file
         temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.mp4')
-        blob.download_to_filename(temp_file.name)
+        temp_file.close()
+        try:
+            blob.download_to_filename(temp_file.name)
+        except Exception:
+            # A failed download leaves no partial file behind
+            os.unlink(temp_file.name)
+            raise
         return temp_file.name
 
     def _extract_frames(self, video_path: str, num_frames: int = 1) -> List[str]:
-        """Extract frames from video and convert to temporary URLs."""
-        cap = cv2.VideoCapture(video_path)
-        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-
-        # Take frame from middle of video
-        middle_frame = total_frames // 2
+        """Extract frames from video and encode them as inline data URLs."""
+        # Take a downscaled frame from the middle of the video
+        jpeg_bytes = extract_middle_frame(video_path)
         frame_urls = []
 
-        cap.set(cv2.CAP_PROP_POS_FRAMES, middle_frame)
-        ret, frame = cap.read()
-        if ret:
-            # Resize frame
-            frame = resize_image(frame)
-            # Convert frame to jpg format with reduced quality
-            encode_params = [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY]
-            _, buffer = cv2.imencode('.jpg', frame, encode_params)
-
-            # Save frame to temporary file in storage
-            temp_frame_path = f"temp/{self.video_id}_frame.jpg"
-            frame_blob = self.storage_client.blob(temp_frame_path)
-            frame_blob.upload_from_string(
-                buffer.tobytes(), content_type='image/jpeg')
-
-            # Get public URL (valid for 1 hour)
-            frame_url = frame_blob.generate_signed_url(
-                version="v4",
-                expiration=3600,  # 1 hour
-                method="GET"
-            )
-            frame_urls.append(frame_url)
+        if jpeg_bytes:
+            # OpenAI accepts the image inline, so no storage round-trip is needed
+            encoded = base64.b64encode(jpeg_bytes).decode('ascii')
+            frame_urls.append(f"data:image/jpeg;base64,{encoded}")
 
-        cap.release()
         return frame_urls
 
-    def _cleanup_temp_files(self):
-        """Clean up temporary files from storage."""
-        try:
-            temp_frame_path = f"temp/{self.video_id}_frame.jpg"
-            frame_blob = self.storage_client.blob(temp_frame_path)
-            if frame_blob.exists():
-                frame_blob.delete()
-        except Exception as e:
-            logger.warning(f"Error cleaning up temp files: {str(e)}")
-
     def _generate_content_description(self, frame_urls: List[str]) -> Dict[str, str]:
         """Generate meaningful title and description using OpenAI API."""
         try:
@@ -309,21 +477,17 @@ class HashtagGenerator:
                 temperature=0.7
             )
 
-            # Split response into individual hashtags
-            hashtags = response.choices[0].message.content.strip().split()
-
-            # Ensure all hashtags start with #
-            hashtags = [tag if tag.startswith(
-                '#') else f'#{tag}' for tag in hashtags]
+            # Split into hashtags that start with a single #, dropping
+            # repeats while keeping the model's order
+            raw_tags = response.choices[0].message.content.split()
+            hashtags = list(dict.fromkeys(
+                f"#{tag.lstrip('#')}" for tag in raw_tags))
 
             return hashtags[:5]  # Limit to maximum 5 hashtags
 
         except Exception as e:
             logger.error(f"Error generating hashtags: {str(e)}")
             return []
-        finally:
-            # Clean up temporary files
-            self._cleanup_temp_files()
 
     def _save_content(self, content: Dict[str, Any]):
         """Save content to Firestore."""
@@ -332,28 +496,30 @@ class HashtagGenerator:
 
         # Update video document in Firestore
         video_ref = self.db.collection('videos').document(self.video_id)
-        video_ref.update({
-            'title': content.get('title', 'Untitled Video'),
-            'description': content.get('description', ''),
-            'metadata': {
-                'hashtags': content.get('hashtags', [])
-            },
-            'hasContent': True,
-            'updatedAt': firestore.SERVER_TIMESTAMP
-        })
+        video_ref.update(_content_update(content))
         logger.info(f"Saved content for video {self.video_id} to Firestore")
 
-    def process(self) -> Dict[str, Any]:
-        """Process video and generate content."""
-        try:
-            # Download video
-            video_path = self._download_video()
+    def process(self, save: bool = True,
+                video_path: Optional[str] = None) -> Dict[str, Any]:
+        """Process video and generate content.
 
-            # Extract frames
-            frame_urls = self._extract_frames(video_path)
+        Args:
+            save: If False, skip the Firestore update and only return the content
+            video_path: Prefetched local copy; downloaded here when missing
+        """
+        try:
+            # Download video unless it was prefetched
+            if video_path is None:
+                video_path = self._download_video()
 
-            # Cleanup video file early to save memory
-            os.unlink(video_path)
+            try:
+                # Extract frames
+                frame_urls = self._extract_frames(video_path)
+            finally:
+                # Cleanup video file early to save memory, even when
+                # extraction fails
+                if video_path and os.path.exists(video_path):
+                    os.unlink(video_path)
 
             # Generate content description
             content = self._generate_content_description(frame_urls)
@@ -371,7 +537,8 @@ class HashtagGenerator:
             }
 
             # Save content
-            self._save_content(result)
+            if save:
+                self._save_content(result)
 
             return {
                 "success": True,
@@ -387,8 +554,6 @@ class HashtagGenerator:
             error_msg = str(e)
             logger.error(
                 f"Error processing video {self.video_id}: {error_msg}")
-            # Make sure to clean up temp files even on error
-            self._cleanup_temp_files()
             return {
                 "success": False,
                 "videoId": self.video_id,
@@ -396,6 +561,33 @@ class HashtagGenerator:
             }
 
 
+def _prefetch_video(video_data: Dict[str, Any], download_q: queue.Queue) -> None:
+    """Download one video and queue it for a worker.
+
+    The put blocks while PREFETCH_DEPTH downloads are already waiting, which
+    bounds the temporary files on disk. A failed download is queued without a
+    path so the worker retries it and reports the error.
+    """
+    try:
+        video_path = HashtagGenerator(
+            video_data['id'], video_data)._download_video()
+    except Exception as e:
+        logger.warning(f"Prefetch failed for video {video_data['id']}: {str(e)}")
+        video_path = None
+    download_q.put((video_data, video_path))
+
+
+def _consume_downloads(download_q: queue.Queue) -> List[Dict[str, Any]]:
+    """Process prefetched videos until the None sentinel arrives."""
+    results = []
+    while True:
+        item = download_q.get()
+        if item is None:
+            return results
+        video_data, video_path = item
+        results.append(process_single_video(video_data, False, video_path))
+
+
 def process_all_videos(force: bool = False) -> Dict[str, Any]:
     """Process all videos that need content generation.
 
@@ -412,19 +604,27 @@ def process_all_videos(force: bool = False) -> Dict[str, Any]:
                 "total": 0
             }
 
-        results = []
-        # Process videos in parallel using ThreadPoolExecutor
+        # Downloader threads keep the queue full while the workers are
+        # extracting frames and waiting on OpenAI
+        download_q = queue.Queue(maxsize=PREFETCH_DEPTH)
         with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-            # Submit all tasks
-            future_to_video = {
-                executor.submit(process_single_video, video): video
-                for video in videos
-            }
+            workers = [
+                executor.submit(_consume_downloads, download_q)
+                for _ in range(MAX_WORKERS)
+            ]
+
+            with ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS) as downloader:
+                for video in videos:
+                    downloader.submit(_prefetch_video, video, download_q)
+
+            # Every download is queued; one sentinel stops each worker
+            for _ in workers:
+                download_q.put(None)
+
+            results = [result for worker in workers for result in worker.result()]
 
-            # Collect results as they complete
-            for future in as_completed(future_to_video):
-                result = future.result()
-                results.append(result)
+        # One batched commit per WRITE_BATCH_SIZE videos
+        _save_results(results)
 
         successful = len([r for r in results if r.get('success', False)])
 
@@ -14,6 +14,14 @@ from . import config
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+try:
+    # libjpeg-turbo's SIMD encoder, when the shared library is available
+    from turbojpeg import TurboJPEG, TJPF_BGR, TJSAMP_420
+    _turbo_jpeg = TurboJPEG()
+except Exception as e:
+    logger.info(f"TurboJPEG unavailable, using OpenCV JPEG encoding: {str(e)}")
+    _turbo_jpeg = None
+
 # Constants for optimization
 MAX_IMAGE_SIZE = 1024  # Maximum dimension for resized images
 JPEG_QUALITY = 85     # JPEG compression quality
@@ -21,16 +29,31 @@ MAX_WORKERS = 3       # Maximum number of concurrent workers
 
 
 def resize_image(frame: np.ndarray) -> np.ndarray:
-    """Resize image while maintaining aspect ratio."""
+    """Resize image while maintaining aspect ratio.
+
+    The BGR frame is resized directly with INTER_AREA, OpenCV's vectorized
+    path for downscaling.
+    """
     height, width = frame.shape[:2]
     if max(height, width) > MAX_IMAGE_SIZE:
         scale = MAX_IMAGE_SIZE / max(height, width)
         new_width = int(width * scale)
         new_height = int(height * scale)
-        return cv2.resize(frame, (new_width, new_height))
+        return cv2.resize(frame, (new_width, new_height),
+                          interpolation=cv2.INTER_AREA)
     return frame
 
 
+def encode_jpeg(frame: np.ndarray) -> bytes:
+    """Encode a BGR frame as JPEG at JPEG_QUALITY."""
+    if _turbo_jpeg is not None:
+        return _turbo_jpeg.encode(frame, quality=JPEG_QUALITY,
+                                  pixel_format=TJPF_BGR, jpeg_subsample=TJSAMP_420)
+    _, buffer = cv2.imencode(
+        '.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY])
+    return buffer.tobytes()
+
+
 def process_single_video(video_path: str, force: bool = False) -> Dict[str, Any]:
     """Process a single video to generate hashtags and content."""
     try:
@@ -85,8 +108,7 @@ def process_single_video(video_path: str, force: bool = False) -> Dict[str, Any]
 
                 if frame_count % 30 == 0:  # Sample every 30 frames
                     frame = resize_image(frame)
-                    _, buffer = cv2.imencode(
-                        '.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY])
+                    buffer = encode_jpeg(frame)
                     frames.append(base64.b64encode(buffer).decode('utf-8'))
 
                 frame_count += 1
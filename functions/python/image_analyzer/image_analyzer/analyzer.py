@@ -5,6 +5,7 @@ import cv2
 import base64
 import logging
 import json
+import threading
 from typing import List, Dict, Any
 import tempfile
 from openai import OpenAI
@@ -21,15 +22,31 @@ MAX_IMAGE_SIZE = 384
 JPEG_QUALITY = 60
 
 
+# Per-thread resize output buffers, reused while the frame size stays the same
+_resize_buffers = threading.local()
+
+
 def resize_image(frame: np.ndarray) -> np.ndarray:
-    """Resize image while maintaining aspect ratio."""
+    """Resize image while maintaining aspect ratio.
+
+    The returned array is a per-thread buffer that the next call may
+    overwrite, so callers must finish with it (e.g. encode it) first.
+    """
     height, width = frame.shape[:2]
-    if height > MAX_IMAGE_SIZE or width > MAX_IMAGE_SIZE:
-        scale = MAX_IMAGE_SIZE / max(height, width)
-        new_width = int(width * scale)
-        new_height = int(height * scale)
-        return cv2.resize(frame, (new_width, new_height), interpolation=cv2.INTER_AREA)
-    return frame
+    longest = max(height, width)
+    if longest <= MAX_IMAGE_SIZE:
+        return frame
+
+    scale = MAX_IMAGE_SIZE / longest
+    shape = (int(height * scale), int(width * scale)) + frame.shape[2:]
+    dst = getattr(_resize_buffers, 'dst', None)
+    if dst is None or dst.shape != shape or dst.dtype != frame.dtype:
+        dst = np.empty(shape, dtype=frame.dtype)
+        _resize_buffers.dst = dst
+
+    # Area averaging pays off for large reductions; bilinear is enough up to 2x
+    interpolation = cv2.INTER_AREA if scale < 0.5 else cv2.INTER_LINEAR
+    return cv2.resize(frame, (shape[1], shape[0]), dst=dst, interpolation=interpolation)
 
 
 class VideoFrameAnalyzer:
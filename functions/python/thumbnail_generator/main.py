@@ -3,15 +3,13 @@
 import functions_framework
 from thumbnail_generator.main import generate_video_thumbnail, health
 from thumbnail_generator.hashtag_generator import HashtagGenerator, process_all_videos
-import json
 from typing import Dict, Any
 import logging
 
 logger = logging.getLogger(__name__)
 
-# Export the existing functions
-generate_video_thumbnail = functions_framework.http(generate_video_thumbnail)
-health = functions_framework.http(health)
+# generate_video_thumbnail and health are already registered as HTTP
+# functions where they are defined, so importing them exports them
 
 
 @functions_framework.http
@@ -38,8 +36,8 @@ def generate_video_hashtags(request) -> Dict[str, Any]:
             }
 
             # Process video
-            with HashtagGenerator(video_id, video_data) as generator:
-                return generator.process()
+            generator = HashtagGenerator(video_id, video_data)
+            return generator.process()
 
         # Case 2: Process all videos without hashtags
         else:
@@ -49,7 +47,3 @@ def generate_video_hashtags(request) -> Dict[str, Any]:
         error_msg = str(e)
         logger.error(f"Error in generate_video_hashtags: {error_msg}")
         return {"error": error_msg}
-
-
-# Export the new function
-generate_video_hashtags = functions_framework.http(generate_video_hashtags)
@@ -6,7 +6,8 @@ import json
 import logging
 import sys
 import argparse
-from typing import Optional
+from datetime import datetime
+from typing import Any, Optional
 
 from thumbnail_generator.config import firebase_config
 from thumbnail_generator.video import VideoProcessor, get_videos_without_thumbnails
@@ -23,6 +24,17 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+def _json_default(value: Any) -> str:
+    """Serialize Firestore timestamps left in document data.
+
+    json's C encoder walks the containers, so only values it cannot encode
+    natively reach this hook.
+    """
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
 def test_list_videos() -> None:
     """Test listing videos without thumbnails."""
     print("\n=== Testing get_videos_without_thumbnails ===")
@@ -32,7 +44,7 @@ def test_list_videos() -> None:
         print(f"\nVideo ID: {video['id']}")
         print(f"Storage URL: {video.get('storageUrl', 'N/A')}")
         print(f"Storage Path: {video.get('storagePath', 'N/A')}")
-        print(f"Full Video Data: {json.dumps(video, indent=2)}")
+        print(f"Full Video Data: {json.dumps(video, indent=2, default=_json_default)}")
 
 
 def test_process_single_video(video_id: Optional[str] = None) -> None:
@@ -60,7 +72,7 @@ def test_process_single_video(video_id: Optional[str] = None) -> None:
 
     with VideoProcessor(test_video['id'], test_video) as processor:
         result = processor.process()
-        print("\nResult:", json.dumps(result, indent=4))
+    print("\nResult:", json.dumps(result, indent=4))
 
 
 def test_process_all_videos() -> None:
@@ -73,15 +85,18 @@ def test_process_all_videos() -> None:
         return
 
     results = []
+    successful = failed = 0
     for video in videos:
         with VideoProcessor(video['id'], video) as processor:
             result = processor.process()
             results.append(result)
+            successful += bool(result.get('success', False))
+            failed += 'error' in result
 
     summary = {
         "total": len(results),
-        "successful": len([r for r in results if r.get('success', False)]),
-        "failed": len([r for r in results if 'error' in r]),
+        "successful": successful,
+        "failed": failed,
         "results": results
     }
 
@@ -62,14 +62,17 @@ def test_process_all_videos():
         return
 
     results = []
+    successful = failed = 0
     for video in videos:
         result = process_video(video)
         results.append(result)
+        successful += 'success' in result
+        failed += 'error' in result
 
     summary = {
         "total": len(results),
-        "successful": len([r for r in results if 'success' in r]),
-        "failed": len([r for r in results if 'error' in r]),
+        "successful": successful,
+        "failed": failed,
         "results": results
     }
 
@@ -1,6 +1,17 @@
 """Thumbnail Generator package for video thumbnail generation."""
 
-from .main import generate_video_thumbnail, health
 from .version import __version__
 
 __all__ = ['generate_video_thumbnail', 'health', '__version__']
+
+
+def __getattr__(name):
+    """Import the HTTP handlers on first use.
+
+    The handlers pull in OpenCV, so importing a sibling module such as
+    hashtag_generator does not pay for it.
+    """
+    if name in ('generate_video_thumbnail', 'health'):
+        from . import main
+        return getattr(main, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
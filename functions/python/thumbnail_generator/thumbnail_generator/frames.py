@@ -0,0 +1,265 @@
+"""Thumbnail frame extraction and encoding shared by the thumbnail handlers."""
+
+import os
+import json
+import subprocess
+import logging
+import shutil
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+try:
+    # Import numpy first to avoid OpenCV import issues
+    import numpy
+    import cv2
+except ImportError as e:
+    logger.error(f"Failed to import required modules: {str(e)}")
+    raise
+
+try:
+    # libjpeg-turbo's SIMD encoder, when the shared library is available
+    from turbojpeg import TurboJPEG, TJFLAG_FASTDCT, TJPF_BGR, TJSAMP_420
+    _turbo_jpeg = TurboJPEG()
+except Exception as e:
+    logger.info(f"TurboJPEG unavailable, using OpenCV JPEG encoding: {str(e)}")
+    _turbo_jpeg = None
+
+# The ffmpeg CLI decodes the thumbnail straight to JPEG; OpenCV is the fallback
+FFMPEG_BINARY = os.getenv('FFMPEG_BINARY', 'ffmpeg')
+FFPROBE_BINARY = os.getenv('FFPROBE_BINARY', 'ffprobe')
+FFMPEG_TIMEOUT = 60  # seconds
+CAPTURE_THREADS = 0  # OpenCV decoder threads; 0 lets FFmpeg pick
+THUMBNAIL_JPEG_QSCALE = 5  # mjpeg qscale (2-31), close to JPEG_QUALITY
+JPEG_QUALITY = 80  # OpenCV fallback encoder quality
+JPEG_ENCODE_PARAMS = [int(cv2.IMWRITE_JPEG_QUALITY), JPEG_QUALITY,
+                      int(cv2.IMWRITE_JPEG_OPTIMIZE), 0]
+THUMBNAIL_WIDTH = 360  # Thumbnails are shown small; never upscaled
+# Even output height keeps the aspect ratio within a pixel
+THUMBNAIL_SCALE_FILTER = f"scale='min({THUMBNAIL_WIDTH},iw)':-2"
+
+# Position of the thumbnail frame as a fraction of the video length
+THUMBNAIL_POSITION = 0.1
+THUMBNAIL_MAX_GRABS = 300  # Caps the frames skipped for long videos
+
+# RAM-backed scratch space for downloaded videos, used when it has room
+SHM_DIR = '/dev/shm'
+SHM_MIN_FREE = 1 << 30  # 1 GiB; small container /dev/shm mounts are skipped
+
+
+def video_temp_dir() -> Optional[str]:
+    """Return /dev/shm when it has room for a video, else None for the default.
+
+    Keeps the download-then-decode handoff in memory on hosts whose temp
+    directory is disk-backed.
+    """
+    try:
+        if shutil.disk_usage(SHM_DIR).free >= SHM_MIN_FREE:
+            return SHM_DIR
+    except OSError:
+        pass
+    return None
+
+
+def probe_video(video_path: str) -> Dict[str, Any]:
+    """Read dimensions, frame rate and duration with one ffprobe call."""
+    result = subprocess.run(
+        [FFPROBE_BINARY, '-v', 'error', '-select_streams', 'v:0',
+         '-show_entries', 'stream=width,height,avg_frame_rate:format=duration',
+         '-of', 'json', video_path],
+        capture_output=True, check=True, timeout=FFMPEG_TIMEOUT)
+    info = json.loads(result.stdout)
+    stream = info['streams'][0]
+
+    # avg_frame_rate is a ratio such as "30000/1001", or "0/0" when unknown
+    num, _, den = stream.get('avg_frame_rate', '0/1').partition('/')
+    fps = int(float(num) / float(den)) if den and float(den) else 0
+
+    dimensions = {"width": int(stream['width']),
+                  "height": int(stream['height']), "fps": fps}
+    duration = float(info.get('format', {}).get('duration') or 0)
+    if duration > 0:
+        dimensions["duration"] = round(duration, 3)
+    return dimensions
+
+
+def generate_thumbnail_ffmpeg(video_path: str, seek_seconds: float = 0.0) -> bytes:
+    """Decode one frame straight to JPEG bytes with the ffmpeg CLI.
+
+    Seeking before -i jumps to the nearest keyframe, and the JPEG comes
+    back on stdout without passing through numpy or PIL.
+    """
+    result = subprocess.run(
+        [FFMPEG_BINARY, '-v', 'error', '-hwaccel', 'auto',
+         '-ss', f"{seek_seconds:.3f}", '-i', video_path,
+         '-frames:v', '1', '-vf', THUMBNAIL_SCALE_FILTER,
+         '-q:v', str(THUMBNAIL_JPEG_QSCALE),
+         '-f', 'image2pipe', '-vcodec', 'mjpeg', 'pipe:1'],
+        capture_output=True, check=True, timeout=FFMPEG_TIMEOUT)
+    if not result.stdout:
+        raise ValueError("ffmpeg returned no frame")
+    return result.stdout
+
+
+def _open_capture(video_path: str):
+    """Open an FFmpeg capture, decoding on the GPU when the host has one.
+
+    OpenCV builds or hosts without a usable accelerator fall back to
+    software decode.
+    """
+    try:
+        cap = cv2.VideoCapture(video_path, cv2.CAP_FFMPEG, [
+            cv2.CAP_PROP_HW_ACCELERATION, cv2.VIDEO_ACCELERATION_ANY,
+            cv2.CAP_PROP_N_THREADS, CAPTURE_THREADS])
+        if cap.isOpened():
+            return cap
+        cap.release()
+    except (AttributeError, TypeError, cv2.error) as e:
+        logger.debug(f"Hardware decode unavailable: {str(e)}")
+    return cv2.VideoCapture(video_path, cv2.CAP_FFMPEG)
+
+
+def _has_cudacodec() -> bool:
+    """Return True when OpenCV was built with cudacodec and sees a CUDA GPU."""
+    try:
+        return hasattr(cv2, 'cudacodec') and cv2.cuda.getCudaEnabledDeviceCount() > 0
+    except (AttributeError, cv2.error):
+        return False
+
+
+# NVDEC decodes the OpenCV fallback frame when a GPU is present
+HAS_CUDACODEC = _has_cudacodec()
+
+# Per-thread frame buffers, reused while the frame size stays the same
+_frame_buffers = threading.local()
+
+
+def _frame_buffer(name: str, shape: Tuple[int, ...]) -> numpy.ndarray:
+    """Return this thread's uint8 buffer for name, reallocating on a new shape.
+
+    The buffer is overwritten by the next video on the same thread, so
+    callers must finish with it (e.g. encode it) first.
+    """
+    buffer = getattr(_frame_buffers, name, None)
+    if buffer is None or buffer.shape != shape:
+        buffer = numpy.empty(shape, dtype=numpy.uint8)
+        setattr(_frame_buffers, name, buffer)
+    return buffer
+
+
+def _thumbnail_index(frame_count: int) -> int:
+    """Return the index of the frame used as the thumbnail."""
+    return min(int(frame_count * THUMBNAIL_POSITION), THUMBNAIL_MAX_GRABS)
+
+
+def _read_frame_cuda(source: str, target: int) -> Optional[numpy.ndarray]:
+    """Decode the thumbnail frame with NVDEC, or return None to use the CPU."""
+    try:
+        reader = cv2.cudacodec.createVideoReader(source)
+        for _ in range(target + 1):
+            success, gpu_frame = reader.nextFrame()
+            if not success:
+                return None
+        return cv2.cuda.cvtColor(gpu_frame, cv2.COLOR_BGRA2BGR).download()
+    except cv2.error as e:
+        logger.debug(f"NVDEC decode failed, using the CPU: {str(e)}")
+        return None
+
+
+def _read_thumbnail_frame(cap, frame_count: int, width: int, height: int) -> numpy.ndarray:
+    """Decode the thumbnail frame about a tenth of the way into the video.
+
+    The first frame is often black or a logo. grab() advances without the
+    colour conversion and copy that retrieve() pays, so only the chosen
+    frame is converted. Falls back to the first frame on short or
+    unreadable streams. Frames are decoded into a per-thread buffer.
+    """
+    frame = _frame_buffer('decoded', (height, width, 3)) if width and height else None
+
+    target = _thumbnail_index(frame_count)
+    if target > 0 and all(cap.grab() for _ in range(target)):
+        success, frame = cap.retrieve(frame)
+        if success:
+            return frame
+        cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+
+    success, frame = cap.read(frame)
+    if not success:
+        raise ValueError("Could not read video frame")
+    return frame
+
+
+def extract_frame_and_meta(source: str) -> Tuple[Dict[str, int], numpy.ndarray]:
+    """Read the video dimensions and thumbnail frame from one capture.
+
+    Opening the container once avoids parsing its headers twice. The frame
+    may live in a per-thread buffer, so encode it before the next call.
+    """
+    cap = _open_capture(source)
+    try:
+        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        fps = int(cap.get(cv2.CAP_PROP_FPS))
+        frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        dimensions = {"width": width, "height": height, "fps": fps}
+        # Lets the hashtag generator seek without probing the file
+        if fps and frame_count > 0:
+            dimensions["duration"] = round(frame_count / fps, 3)
+
+        # The capture still supplies the properties on GPU hosts
+        if HAS_CUDACODEC:
+            frame = _read_frame_cuda(source, _thumbnail_index(frame_count))
+            if frame is not None:
+                return dimensions, frame
+
+        return dimensions, _read_thumbnail_frame(cap, frame_count, width, height)
+    finally:
+        cap.release()
+
+
+def encode_thumbnail(frame: numpy.ndarray) -> bytes:
+    """Downscale a captured BGR frame and encode it as a JPEG thumbnail."""
+    try:
+        # Shrink before encoding; JPEG cost and size scale with pixels
+        height, width = frame.shape[:2]
+        if width > THUMBNAIL_WIDTH:
+            shape = (round(height * THUMBNAIL_WIDTH / width), THUMBNAIL_WIDTH, 3)
+            frame = cv2.resize(frame, (shape[1], shape[0]),
+                               dst=_frame_buffer('thumbnail', shape),
+                               interpolation=cv2.INTER_AREA)
+
+        if _turbo_jpeg is not None:
+            return _turbo_jpeg.encode(frame, quality=JPEG_QUALITY,
+                                      pixel_format=TJPF_BGR, jpeg_subsample=TJSAMP_420,
+                                      flags=TJFLAG_FASTDCT)
+
+        # imencode takes BGR directly, so no colour conversion or PIL copy
+        success, buffer = cv2.imencode('.jpg', frame, JPEG_ENCODE_PARAMS)
+        if not success:
+            raise ValueError("Could not encode thumbnail")
+        return buffer.tobytes()
+    except Exception as e:
+        logger.error(f"Error generating thumbnail: {str(e)}")
+        raise
+
+
+def generate_thumbnail(source: str) -> Tuple[Dict[str, Any], bytes]:
+    """Return the video dimensions and a JPEG thumbnail.
+
+    Uses the ffmpeg CLI, and falls back to OpenCV when ffmpeg is missing
+    or cannot decode the file.
+
+    Args:
+        source: Local path or URL to read the video from
+    """
+    try:
+        dimensions = probe_video(source)
+        seek_seconds = dimensions.get("duration", 0) * THUMBNAIL_POSITION
+        return dimensions, generate_thumbnail_ffmpeg(source, seek_seconds)
+    except (OSError, subprocess.SubprocessError, ValueError, KeyError, IndexError) as e:
+        logger.warning(f"ffmpeg thumbnail failed, using OpenCV: {str(e)}")
+
+    dimensions, frame = extract_frame_and_meta(source)
+    return dimensions, encode_thumbnail(frame)
@@ -1,46 +1,308 @@
 """Module for generating hashtags from video content using OpenAI."""
 
 import os
-import cv2
+import re
+import asyncio
 import base64
 import logging
-from typing import List, Dict, Any
+import shutil
+import subprocess
+import threading
+import time
+from datetime import timedelta
+from functools import lru_cache
+from typing import List, Dict, Any, Optional
 import tempfile
-from openai import OpenAI
+from openai import AsyncOpenAI
 from .config import firebase_config
 import firebase_admin
 from firebase_admin import storage, firestore
 from concurrent.futures import ThreadPoolExecutor, as_completed
-import numpy as np
 import json
 
+try:
+    import orjson
+    _loads = orjson.loads
+except ImportError:
+    _loads = json.loads
+
 logger = logging.getLogger(__name__)
 
 # Storage bucket name
 BUCKET_NAME = "reelai-c82fc.firebasestorage.app"
 
 # Constants for optimization
-MAX_IMAGE_SIZE = 384  # Reduced from 512 to save memory
+MAX_IMAGE_SIZE = 512  # OpenAI's detail:"low" tile; smaller frames are not upscaled
 JPEG_QUALITY = 60    # Reduced from 80 to save memory
-MAX_WORKERS = 3      # Reduced from 5 to save memory
+MAX_WORKERS = 16     # Concurrent downloads and Firestore writes (network-bound)
+MAX_CONCURRENT_REQUESTS = 16  # Videos in flight at once, capping peak memory
+EXTRACT_WORKERS = os.cpu_count() or 1  # Concurrent ffmpeg decodes, one per core
+
+# ffmpeg seeks, decodes and downscales the sampled frame in one process
+FFMPEG_BINARY = os.getenv('FFMPEG_BINARY', 'ffmpeg')
+FFPROBE_BINARY = os.getenv('FFPROBE_BINARY', 'ffprobe')
+FFMPEG_TIMEOUT = 60   # seconds
+FFMPEG_JPEG_QSCALE = 6  # mjpeg qscale (2-31), roughly JPEG_QUALITY
+STREAM_CHUNK_SIZE = 1 << 20  # Bytes per read when piping a blob into ffmpeg
+STREAM_PROBE_BYTES = 8 << 20  # Header bytes piped to ffprobe before giving up
+SIGNED_URL_EXPIRATION = timedelta(minutes=5)  # ffmpeg only reads it while seeking
+# Fit the frame inside MAX_IMAGE_SIZE x MAX_IMAGE_SIZE without upscaling
+FRAME_SCALE_FILTER = (
+    f"scale='min({MAX_IMAGE_SIZE},iw)':'min({MAX_IMAGE_SIZE},ih)'"
+    ":force_original_aspect_ratio=decrease"
+)
+
+# Video blobs outside the generated-asset directories
+_VIDEO_RE = re.compile(
+    r"^(?!thumbnails/|metadata/|temp/).+\.(mp4|mov|avi)$", re.IGNORECASE)
+
+# Partial-response field mask for blob listings
+BLOB_LIST_FIELDS = "items(name),nextPageToken"
+# Server-side filter so only video files are listed at all
+VIDEO_MATCH_GLOB = "**.{[mM][pP]4,[mM][oO][vV],[aA][vV][iI]}"
+
+# Firestore batching limits
+GET_ALL_CHUNK_SIZE = 300  # Documents per get_all request
+WRITE_BATCH_SIZE = 500    # Maximum operations per WriteBatch
+SCAN_WORKERS = 8          # Concurrent get_all requests while listing blobs
+BULK_WRITE_MAX_ATTEMPTS = 5  # Tries per BulkWriter update before giving up
+
+# Recent scan results, keyed by bucket name, so bursty callers skip a rescan
+SCAN_CACHE_TTL = 60  # seconds
+_scan_cache: Dict[str, tuple] = {}
+# Storage is listed on a cold start and at least this often, even while the
+# Firestore query has a backlog, so storage-only uploads are not starved
+STORAGE_SCAN_INTERVAL = 15 * 60  # seconds
+_storage_scanned_at: Dict[str, float] = {}
+_scan_cache_lock = threading.RLock()
+
+
+@lru_cache(maxsize=1)
+def _bucket():
+    """Return the shared storage bucket handle."""
+    return storage.bucket(BUCKET_NAME)
+
+
+@lru_cache(maxsize=1)
+def _db():
+    """Return the shared Firestore client."""
+    return firestore.client()
+
+
+def _chunks(items: List[Any], size: int):
+    """Yield successive slices of at most size items."""
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _probe_duration_cv2(video_path: str) -> float:
+    """Return the duration from OpenCV's frame count and rate, or 0."""
+    # Imported on first use so the ffmpeg path never loads OpenCV
+    import cv2
+
+    cap = cv2.VideoCapture(video_path)
+    try:
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        frame_count = cap.get(cv2.CAP_PROP_FRAME_COUNT)
+        return frame_count / fps if fps and frame_count > 0 else 0.0
+    finally:
+        cap.release()
+
 
+def _extract_middle_frame_cv2(video_path: str) -> bytes:
+    """Decode, downscale and encode the middle frame with OpenCV.
+
+    Used when ffmpeg is missing or cannot read the video, e.g. where only
+    imageio-ffmpeg is installed and there is no ffprobe.
+    """
+    import cv2
+
+    cap = cv2.VideoCapture(video_path)
+    try:
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        cap.set(cv2.CAP_PROP_POS_FRAMES, total_frames // 2)
+        success, frame = cap.read()
+    finally:
+        cap.release()
+    if not success:
+        logger.error("OpenCV could not read the middle frame")
+        return b''
 
-def resize_image(frame: np.ndarray) -> np.ndarray:
-    """Resize image while maintaining aspect ratio."""
     height, width = frame.shape[:2]
     if height > MAX_IMAGE_SIZE or width > MAX_IMAGE_SIZE:
         scale = MAX_IMAGE_SIZE / max(height, width)
-        new_width = int(width * scale)
-        new_height = int(height * scale)
-        return cv2.resize(frame, (new_width, new_height), interpolation=cv2.INTER_AREA)
-    return frame
+        frame = cv2.resize(frame, (int(width * scale), int(height * scale)),
+                           interpolation=cv2.INTER_AREA)
+    success, buffer = cv2.imencode(
+        '.jpg', frame, [int(cv2.IMWRITE_JPEG_QUALITY), JPEG_QUALITY])
+    return buffer.tobytes() if success else b''
+
+
+def probe_duration(video_path: str) -> float:
+    """Return the container duration in seconds, or 0 when it is unknown.
+
+    Falls back to OpenCV when ffprobe is missing or does not finish.
+    """
+    try:
+        result = subprocess.run(
+            [FFPROBE_BINARY, '-v', 'error', '-show_entries', 'format=duration',
+             '-of', 'csv=p=0', video_path],
+            capture_output=True, text=True, timeout=FFMPEG_TIMEOUT)
+    except (OSError, subprocess.SubprocessError) as e:
+        logger.warning(f"ffprobe failed, reading the duration with OpenCV: {str(e)}")
+        return _probe_duration_cv2(video_path)
+    try:
+        return float(result.stdout.strip())
+    except ValueError:
+        return 0.0
+
+
+def extract_middle_frame(video_path: str, duration: Optional[float] = None) -> bytes:
+    """Decode one downscaled JPEG frame from the middle of the video.
+
+    Seeking before the input makes ffmpeg jump to the nearest keyframe, and
+    with inexact seeking and non-key frames skipped only that keyframe is
+    decoded, regardless of the file size. A known duration skips the ffprobe
+    run. OpenCV decodes the frame when ffmpeg is missing or fails.
+    """
+    try:
+        seek_seconds = (duration or probe_duration(video_path)) / 2
+        result = subprocess.run(
+            [FFMPEG_BINARY, '-v', 'error',
+             '-skip_frame', 'nokey', '-noaccurate_seek',
+             '-ss', f"{seek_seconds:.3f}", '-i', video_path,
+             '-frames:v', '1', '-vf', FRAME_SCALE_FILTER,
+             '-q:v', str(FFMPEG_JPEG_QSCALE),
+             '-f', 'image2pipe', '-vcodec', 'mjpeg', 'pipe:1'],
+            capture_output=True, timeout=FFMPEG_TIMEOUT)
+    except (OSError, subprocess.SubprocessError) as e:
+        logger.warning(f"ffmpeg unavailable, using OpenCV: {str(e)}")
+        return _extract_middle_frame_cv2(video_path)
+    if result.returncode != 0 or not result.stdout:
+        logger.warning(
+            f"ffmpeg frame extraction failed, using OpenCV: {result.stderr.decode(errors='replace').strip()}")
+        return _extract_middle_frame_cv2(video_path)
+    return result.stdout
+
+
+def _signed_url(blob) -> Optional[str]:
+    """Return a short-lived URL ffmpeg can range-read the blob from, or None."""
+    try:
+        return blob.generate_signed_url(
+            version='v4', expiration=SIGNED_URL_EXPIRATION)
+    except Exception as e:
+        logger.warning(f"Could not sign {blob.name}: {str(e)}")
+        return None
+
+
+def _run_on_blob_stream(blob, args: List[str],
+                        limit: Optional[int] = None) -> subprocess.CompletedProcess:
+    """Run an ffmpeg/ffprobe command that reads the blob from stdin.
+
+    A feeder thread copies the blob, or only its first limit bytes, into the
+    pipe while communicate() drains stdout and stderr, so a chatty command
+    cannot fill a pipe and stall. The command is killed if it overruns
+    FFMPEG_TIMEOUT, and the feeder stops as soon as the command exits.
+    """
+    read_fd, write_fd = os.pipe()
+    try:
+        proc = subprocess.Popen(
+            args, stdin=read_fd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    except BaseException:
+        os.close(write_fd)
+        raise
+    finally:
+        # The child has its own copy; closing ours makes writes fail once it exits
+        os.close(read_fd)
+
+    def feed():
+        try:
+            with open(write_fd, 'wb') as stdin, \
+                    blob.open('rb', chunk_size=STREAM_CHUNK_SIZE) as src:
+                if limit is None:
+                    shutil.copyfileobj(src, stdin, STREAM_CHUNK_SIZE)
+                else:
+                    stdin.write(src.read(limit))
+        except BrokenPipeError:
+            # The command exited before reading the whole blob
+            pass
+        except Exception as e:
+            logger.warning(f"Error streaming {blob.name} to {args[0]}: {str(e)}")
+
+    feeder = threading.Thread(target=feed, daemon=True)
+    feeder.start()
+    try:
+        stdout, stderr = proc.communicate(timeout=FFMPEG_TIMEOUT)
+    except subprocess.TimeoutExpired:
+        logger.warning(f"{args[0]} timed out reading {blob.name}")
+        proc.kill()
+        stdout, stderr = proc.communicate()
+    finally:
+        feeder.join()
+    return subprocess.CompletedProcess(args, proc.returncode, stdout, stderr)
+
+
+def stream_probe_duration(blob) -> float:
+    """Return a blob's duration from its streamed header, or 0 when unknown.
+
+    ffprobe only reads the container header, so for a faststart MP4 this
+    costs a few chunks. Only STREAM_PROBE_BYTES are piped, so an MP4 whose
+    moov atom is at the end fails fast instead of streaming the whole file.
+    """
+    try:
+        result = _run_on_blob_stream(
+            blob, [FFPROBE_BINARY, '-v', 'error', '-show_entries', 'format=duration',
+                   '-of', 'csv=p=0', 'pipe:0'],
+            limit=STREAM_PROBE_BYTES)
+    except OSError as e:
+        # No ffprobe; the caller downloads the video and OpenCV reads it
+        logger.warning(f"Could not run ffprobe: {str(e)}")
+        return 0.0
+    try:
+        return float(result.stdout.decode().strip())
+    except ValueError:
+        return 0.0
+
 
+def stream_middle_frame(blob, duration: float) -> bytes:
+    """Decode one downscaled JPEG frame from the middle of a blob as it downloads.
 
-def process_single_video(video_data: Dict[str, Any]) -> Dict[str, Any]:
-    """Process a single video in a separate thread."""
+    The blob is piped into ffmpeg's stdin, so decoding overlaps the download
+    instead of waiting for a temp file. A pipe cannot seek, so the seek runs
+    as an output option and needs the duration up front; skipping non-key
+    frames keeps ffmpeg from decoding everything before the midpoint.
+    Returns b'' when ffmpeg cannot read the stream, e.g. an MP4 whose moov
+    atom is at the end.
+    """
     try:
-        with HashtagGenerator(video_data['id'], video_data) as generator:
-            return generator.process()
+        result = _run_on_blob_stream(
+            blob, [FFMPEG_BINARY, '-v', 'error',
+                   '-skip_frame', 'nokey', '-i', 'pipe:0',
+                   '-ss', f"{duration / 2:.3f}",
+                   '-frames:v', '1', '-vf', FRAME_SCALE_FILTER,
+                   '-q:v', str(FFMPEG_JPEG_QSCALE),
+                   '-f', 'image2pipe', '-vcodec', 'mjpeg', 'pipe:1'])
+    except OSError as e:
+        logger.warning(f"Could not run ffmpeg: {str(e)}")
+        return b''
+
+    if result.returncode != 0 or not result.stdout:
+        logger.warning(
+            f"ffmpeg could not decode streamed {blob.name}: {result.stderr.decode(errors='replace').strip()}")
+        return b''
+    return result.stdout
+
+
+def process_single_video(video_data: Dict[str, Any], save: bool = True) -> Dict[str, Any]:
+    """Process a single video in a separate thread.
+
+    Args:
+        save: If False, return the generated content without writing it so
+            the caller can batch the Firestore updates
+    """
+    try:
+        generator = HashtagGenerator(video_data['id'], video_data)
+        return generator.process(save=save)
     except Exception as e:
         logger.error(f"Error processing video {video_data['id']}: {str(e)}")
         return {
@@ -50,86 +312,285 @@ def process_single_video(video_data: Dict[str, Any]) -> Dict[str, Any]:
         }
 
 
+def clear_scan_cache() -> None:
+    """Drop cached get_videos_without_hashtags results."""
+    with _scan_cache_lock:
+        _scan_cache.clear()
+
+
 def get_videos_without_hashtags() -> List[Dict[str, Any]]:
-    """Get list of videos that don't have hashtags yet and sync storage with Firestore."""
+    """Get list of videos that don't have hashtags yet and sync storage with Firestore.
+
+    Results are cached for SCAN_CACHE_TTL seconds and invalidated whenever
+    hashtags are saved for a video.
+    """
+    with _scan_cache_lock:
+        cached = _scan_cache.get(BUCKET_NAME)
+        if cached and cached[0] > time.monotonic():
+            logger.info("Using cached list of videos without hashtags")
+            return list(cached[1])
+
+    videos = _scan_videos_without_hashtags()
+    if videos is not None:
+        with _scan_cache_lock:
+            _scan_cache[BUCKET_NAME] = (
+                time.monotonic() + SCAN_CACHE_TTL, videos)
+        return list(videos)
+    return []
+
+
+def _scan_videos_without_hashtags() -> Optional[List[Dict[str, Any]]]:
+    """Scan storage and Firestore for videos without hashtags, or None on error."""
     try:
         # Initialize Firebase if not already initialized
         if not firebase_admin._apps:
             firebase_config.initialize()
 
-        storage_client = storage.bucket(BUCKET_NAME)
-        db = firestore.client()
-
-        # List all files in storage root
-        logger.info("Listing blobs in storage root")
-        blobs = list(storage_client.list_blobs())
-        logger.info(f"Found {len(blobs)} total blobs in storage")
+        storage_client = _bucket()
+        db = _db()
 
-        videos_without_hashtags = []
         videos_collection = db.collection('videos')
 
-        for blob in blobs:
-            logger.info(f"Processing blob: {blob.name}")
-
-            # Skip thumbnails directory and non-video files
-            if (blob.name.startswith('thumbnails/') or
-                blob.name.startswith('metadata/') or
-                    not blob.name.lower().endswith(('.mp4', '.mov', '.avi'))):
-                logger.info(
-                    f"Skipping non-video file or directory: {blob.name}")
-                continue
+        # Documents already flagged as unprocessed answer from the index
+        queued = _query_videos_without_hashtags(videos_collection)
+        with _scan_cache_lock:
+            scanned_at = _storage_scanned_at.get(BUCKET_NAME)
+        storage_scan_due = (scanned_at is None or
+                            time.monotonic() - scanned_at >= STORAGE_SCAN_INTERVAL)
+        if queued and not storage_scan_due:
+            logger.info(f"Found {len(queued)} videos without hashtags")
+            return queued
+
+        # List storage when nothing is queued, on a cold start, or when the
+        # last listing is stale
+        logger.info("Listing blobs in storage root")
+        video_blobs = []
+        snapshots = {}
+        total_blobs = 0
+
+        with ThreadPoolExecutor(max_workers=SCAN_WORKERS) as executor:
+            futures = []
+            seen_ids = set()
+
+            # Only video blob names are read, so filter server-side and
+            # request a partial response
+            blob_pages = storage_client.list_blobs(
+                fields=BLOB_LIST_FIELDS, match_glob=VIDEO_MATCH_GLOB).pages
+            for page in blob_pages:
+                page_refs = []
+
+                for blob in page:
+                    total_blobs += 1
+
+                    # Skip generated-asset directories and non-video files
+                    if not _VIDEO_RE.match(blob.name):
+                        logger.debug(
+                            "Skipping non-video file or directory: %s", blob.name)
+                        continue
+
+                    video_id = os.path.splitext(os.path.basename(blob.name))[0]
+                    video_blobs.append((video_id, blob.name))
+                    if video_id not in seen_ids:
+                        seen_ids.add(video_id)
+                        page_refs.append(videos_collection.document(video_id))
+
+                # Look up this page's documents while the next page is listed
+                for chunk in _chunks(page_refs, GET_ALL_CHUNK_SIZE):
+                    futures.append(executor.submit(_get_snapshots, db, chunk))
+
+            for future in as_completed(futures):
+                for snapshot in future.result():
+                    snapshots[snapshot.id] = snapshot
+
+        logger.info(f"Found {total_blobs} total blobs in storage")
 
-            video_id = os.path.splitext(os.path.basename(blob.name))[0]
+        videos_without_hashtags = []
+        # New documents for storage-only videos, and hasHashtags flags for
+        # existing documents that lack the field and so miss the query
+        document_writes = {}
 
-            # Get or create video document in Firestore
-            video_ref = videos_collection.document(video_id)
-            video_doc = video_ref.get()
+        for video_id, blob_name in video_blobs:
+            snapshot = snapshots.get(video_id)
 
-            if not video_doc.exists:
-                # Create new video document if it doesn't exist
-                video_ref.set({
+            if snapshot is None or not snapshot.exists:
+                # Queue a new video document for storage-only videos
+                document_writes.setdefault(video_id, {
                     'id': video_id,
-                    'storagePath': blob.name,
+                    'storagePath': blob_name,
                     'createdAt': firestore.SERVER_TIMESTAMP,
                     'hasHashtags': False
                 })
-                logger.info(f"Created new video document for: {video_id}")
-                video_doc = video_ref.get()  # Refresh document
-
-            video_data = video_doc.to_dict()
+                has_hashtags = False
+                duration = None
+            else:
+                data = snapshot.to_dict()
+                if 'hasHashtags' not in data:
+                    document_writes[video_id] = {'hasHashtags': False}
+                has_hashtags = data.get('hasHashtags', False)
+                duration = _duration(data)
 
             # Check if video needs hashtags
-            if not video_data.get('hasHashtags', False):
+            if not has_hashtags:
                 logger.info(f"No hashtags found for video: {video_id}")
                 videos_without_hashtags.append({
                     'id': video_id,
-                    'storagePath': blob.name
+                    'storagePath': blob_name,
+                    'duration': duration
                 })
             else:
                 logger.info(f"Hashtags already exist for video: {video_id}")
 
-        logger.info(
-            f"Found {len(videos_without_hashtags)} videos without hashtags")
-        return videos_without_hashtags
+        _write_video_documents(db, videos_collection, document_writes)
+        with _scan_cache_lock:
+            _storage_scanned_at[BUCKET_NAME] = time.monotonic()
+
+        # Queried documents come first; storage adds anything they missed
+        videos = {video['id']: video for video in queued}
+        for video in videos_without_hashtags:
+            videos.setdefault(video['id'], video)
+
+        logger.info(f"Found {len(videos)} videos without hashtags")
+        return list(videos.values())
 
     except Exception as e:
         logger.error(f"Error getting videos without hashtags: {str(e)}")
-        return []
+        return None
+
+
+def _query_videos_without_hashtags(videos_collection) -> List[Dict[str, Any]]:
+    """Return videos whose documents are marked hasHashtags == False.
+
+    Relies on the single-field index on hasHashtags; documents without a
+    storagePath cannot be processed and are left for the storage scan.
+    Documents lacking the field do not match; the storage scan flags them
+    hasHashtags False so later queries find them.
+    """
+    videos = []
+    for doc in videos_collection.where('hasHashtags', '==', False).stream():
+        data = doc.to_dict() or {}
+        storage_path = data.get('storagePath')
+        if storage_path:
+            videos.append({
+                'id': doc.id,
+                'storagePath': storage_path,
+                'duration': _duration(data)
+            })
+        else:
+            logger.debug("Video %s has no storagePath", doc.id)
+    return videos
+
+
+def _duration(data: Dict[str, Any]) -> Optional[float]:
+    """Return the video duration recorded by the thumbnail generator, if any."""
+    return (data.get('metadata') or {}).get('duration')
+
+
+def _get_snapshots(db, refs: List[Any]) -> List[Any]:
+    """Fetch a chunk of document snapshots in one batched read."""
+    return list(db.get_all(refs))
+
+
+def _write_video_documents(db, videos_collection, documents: Dict[str, Dict[str, Any]]) -> None:
+    """Merge fields into video documents, creating any that are missing.
+
+    Writes go out in as few batched commits as possible. Commits are
+    independent of each other, so they run concurrently.
+    """
+    items = list(documents.items())
+    batches = []
+    for chunk in _chunks(items, WRITE_BATCH_SIZE):
+        batch = db.batch()
+        for video_id, data in chunk:
+            batch.set(videos_collection.document(video_id), data, merge=True)
+        batches.append(batch)
+
+    if len(batches) == 1:
+        batches[0].commit()
+    elif batches:
+        with ThreadPoolExecutor(max_workers=min(SCAN_WORKERS, len(batches))) as executor:
+            # list() re-raises the first failed commit
+            list(executor.map(lambda batch: batch.commit(), batches))
+
+    for video_id, data in items:
+        if 'createdAt' in data:
+            logger.info(f"Created new video document for: {video_id}")
+        else:
+            logger.info(f"Flagged video document without hasHashtags: {video_id}")
+
+
+def _content_update(content: Dict[str, Any]) -> Dict[str, Any]:
+    """Build the Firestore update for generated video content."""
+    return {
+        'title': content.get('title', 'Untitled Video'),
+        'description': content.get('description', ''),
+        'hashtags': content.get('hashtags', []),
+        'hasHashtags': True,
+        'updatedAt': firestore.SERVER_TIMESTAMP
+    }
+
+
+def _save_results(results: List[Dict[str, Any]]) -> None:
+    """Write generated content for successful results with a BulkWriter.
+
+    BulkWriter parallelizes the updates and ramps up to the write quota on
+    its own, retrying failed writes with backoff. Results whose update still
+    fails are marked as failed in place.
+    """
+    successful = {r['videoId']: r for r in results if r.get('success', False)}
+    if not successful:
+        return
+
+    db = _db()
+    videos_collection = db.collection('videos')
+    bulk_writer = db.bulk_writer()
+
+    def on_write_error(error, _writer) -> bool:
+        if error.attempts < BULK_WRITE_MAX_ATTEMPTS:
+            return True
+        logger.error(
+            f"Error saving content for video {error.reference.id}: {error.message}")
+        result = successful.get(error.reference.id)
+        if result is not None:
+            result['success'] = False
+            result['error'] = error.message
+        return False
+
+    bulk_writer.on_write_error(on_write_error)
+    for video_id, result in successful.items():
+        bulk_writer.update(videos_collection.document(video_id),
+                           _content_update(result))
+    # Blocks until every queued update has been written or given up on
+    bulk_writer.close()
+
+    saved = sum(1 for r in successful.values() if r.get('success', False))
+    logger.info(f"Saved content for {saved} videos to Firestore")
+
+    # Saved videos no longer belong in the cached scan results
+    clear_scan_cache()
+
+
+def _data_url(jpeg_bytes: bytes) -> str:
+    """Encode a JPEG inline; OpenAI accepts it without a storage round-trip."""
+    encoded = base64.b64encode(jpeg_bytes).decode('ascii')
+    return f"data:image/jpeg;base64,{encoded}"
 
 
 class HashtagGenerator:
-    def __init__(self, video_id: str, video_data: Dict[str, Any]):
+    def __init__(self, video_id: str, video_data: Dict[str, Any],
+                 openai_client: Optional[AsyncOpenAI] = None):
+        """Set up the generator for one video.
+
+        Args:
+            openai_client: Client shared across videos on the same event loop;
+                when omitted, a client is created and closed by aprocess
+        """
         self.video_id = video_id
         self.video_data = video_data
-        self.storage_client = storage.bucket(BUCKET_NAME)
-        self.openai_client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
-        self.db = firestore.client()
-
-    def __enter__(self):
-        return self
-
-    def __exit__(self, exc_type, exc_val, exc_tb):
-        pass
+        self.storage_client = _bucket()
+        self.db = _db()
+        self._owns_openai_client = openai_client is None
+        self.openai_client = openai_client or AsyncOpenAI(
+            api_key=os.getenv('OPENAI_API_KEY'))
 
     def _download_video(self) -> str:
         """Download video to temporary file."""
@@ -141,53 +602,64 @@ class HashtagGenerator:
         blob.download_to_filename(temp_file.name)
         return temp_file.name
 
-    def _extract_frames(self, video_path: str, num_frames: int = 1) -> List[str]:
-        """Extract frames from video and convert to temporary URLs."""
-        cap = cv2.VideoCapture(video_path)
-        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    async def _load_frames(self, executor: Optional[ThreadPoolExecutor],
+                           extract_executor: Optional[ThreadPoolExecutor]) -> List[str]:
+        """Sample frames without downloading the whole blob when possible.
+
+        ffmpeg normally reads a signed URL, so it range-requests the index and
+        seeks on the input to the middle keyframe, whatever the moov position.
+        If the blob cannot be signed it is piped into ffmpeg instead, with the
+        duration from the recorded metadata or the streamed header. Network
+        work runs on executor and ffmpeg decodes on extract_executor, so each
+        stage is sized for its own bottleneck. A full download is the fallback.
+        """
+        loop = asyncio.get_running_loop()
+        blob = self.storage_client.blob(self.video_data['storagePath'])
+        duration = self.video_data.get('duration')
+
+        # Signing may call the IAM API when the credentials hold no key
+        if url := await loop.run_in_executor(executor, _signed_url, blob):
+            buffer = await loop.run_in_executor(
+                extract_executor, extract_middle_frame, url, duration)
+        else:
+            if not duration:
+                duration = await loop.run_in_executor(
+                    extract_executor, stream_probe_duration, blob)
+            buffer = b''
+            if duration:
+                buffer = await loop.run_in_executor(
+                    extract_executor, stream_middle_frame, blob, duration)
+        if buffer:
+            return [_data_url(buffer)]
+        logger.info(
+            f"Falling back to a full download for video {self.video_id}")
+
+        # Download video
+        video_path = await loop.run_in_executor(executor, self._download_video)
+        try:
+            return await loop.run_in_executor(
+                extract_executor, self._extract_frames, video_path)
+        finally:
+            # Cleanup video file early to save memory
+            os.unlink(video_path)
 
-        # Take frame from middle of video
-        middle_frame = total_frames // 2
+    def _extract_frames(self, video_path: str, num_frames: int = 1) -> List[str]:
+        """Extract frames from video and encode them as inline data URLs."""
+        # Take frame from middle of video, already resized and JPEG-encoded
+        buffer = extract_middle_frame(
+            video_path, self.video_data.get('duration'))
         frame_urls = []
 
-        cap.set(cv2.CAP_PROP_POS_FRAMES, middle_frame)
-        ret, frame = cap.read()
-        if ret:
-            # Resize frame
-            frame = resize_image(frame)
-            # Convert frame to jpg format with reduced quality
-            encode_params = [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY]
-            _, buffer = cv2.imencode('.jpg', frame, encode_params)
-
-            # Save frame to temporary file in storage
-            temp_frame_path = f"temp/{self.video_id}_frame.jpg"
-            frame_blob = self.storage_client.blob(temp_frame_path)
-            frame_blob.upload_from_string(
-                buffer.tobytes(), content_type='image/jpeg')
-
-            # Get public URL (valid for 1 hour)
-            frame_url = frame_blob.generate_signed_url(
-                version="v4",
-                expiration=3600,  # 1 hour
-                method="GET"
-            )
-            frame_urls.append(frame_url)
+        if buffer:
+            frame_urls.append(_data_url(buffer))
 
-        cap.release()
         return frame_urls
 
-    def _cleanup_temp_files(self):
-        """Clean up temporary files from storage."""
-        try:
-            temp_frame_path = f"temp/{self.video_id}_frame.jpg"
-            frame_blob = self.storage_client.blob(temp_frame_path)
-            if frame_blob.exists():
-                frame_blob.delete()
-        except Exception as e:
-            logger.warning(f"Error cleaning up temp files: {str(e)}")
+    async def _generate_content(self, frame_urls: List[str]) -> Dict[str, Any]:
+        """Generate title, description and hashtags in one OpenAI request.
 
-    def _generate_content_description(self, frame_urls: List[str]) -> Dict[str, str]:
-        """Generate meaningful title and description using OpenAI API."""
+        Raises when the request fails or its reply is not valid JSON.
+        """
         try:
             messages = [
                 {
@@ -195,7 +667,7 @@ class HashtagGenerator:
                     "content": [
                         {
                             "type": "text",
-                            "text": "Analyze this video frame and provide a concise, engaging title and description. Format your response as JSON with 'title' and 'description' fields. The title should be catchy but accurate (max 50 chars). The description should be informative and engaging (max 150 chars)."
+                            "text": "Analyze this video frame and provide a concise, engaging title, description and hashtags. Format your response as JSON with 'title', 'description' and 'hashtags' fields. The title should be catchy but accurate (max 50 chars). The description should be informative and engaging (max 150 chars). 'hashtags' should be an array of 3-5 relevant hashtags, each starting with '#', focused on the main subjects, themes, and activities."
                         },
                         {
                             "type": "image_url",
@@ -208,71 +680,35 @@ class HashtagGenerator:
                 }
             ]
 
-            response = self.openai_client.chat.completions.create(
+            response = await self.openai_client.chat.completions.create(
                 model="gpt-4-turbo",  # DO NOT CHANGE THIS MODEL
                 messages=messages,
-                max_tokens=100,
+                max_tokens=180,
                 temperature=0.7,
                 response_format={"type": "json_object"}
             )
 
-            content = json.loads(response.choices[0].message.content)
-            return {
-                'title': content['title'][:50],
-                'description': content['description'][:150]
-            }
-
+            content = _loads(response.choices[0].message.content)
         except Exception as e:
-            logger.error(f"Error generating content description: {str(e)}")
-            return {
-                'title': 'Untitled Video',
-                'description': 'No description available'
-            }
+            # Raised rather than replaced with a placeholder, so the video is
+            # not saved with hasHashtags True and stays in the backlog
+            logger.error(f"Error generating content: {str(e)}")
+            raise
+
+        # Make every hashtag start with a single #, dropping repeats while
+        # keeping the model's order
+        raw_tags = content.get('hashtags') or []
+        if isinstance(raw_tags, str):
+            raw_tags = raw_tags.split()
+        hashtags = list(dict.fromkeys(
+            f"#{tag.strip().lstrip('#')}" for tag in map(str, raw_tags)
+            if tag.strip().lstrip('#')))
 
-    def _generate_hashtags(self, frame_urls: List[str]) -> List[str]:
-        """Generate hashtags using OpenAI API."""
-        try:
-            messages = [
-                {
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "text",
-                            "text": "Generate 3-5 relevant hashtags for this video content. Focus on the main subjects, themes, and activities. Return only the hashtags without explanation, separated by spaces."
-                        },
-                        {
-                            "type": "image_url",
-                            "image_url": {
-                                "url": frame_urls[0],
-                                "detail": "low"
-                            }
-                        }
-                    ]
-                }
-            ]
-
-            response = self.openai_client.chat.completions.create(
-                model="gpt-4-turbo",  # DO NOT CHANGE THIS MODEL
-                messages=messages,
-                max_tokens=50,
-                temperature=0.7
-            )
-
-            # Split response into individual hashtags
-            hashtags = response.choices[0].message.content.strip().split()
-
-            # Ensure all hashtags start with #
-            hashtags = [tag if tag.startswith(
-                '#') else f'#{tag}' for tag in hashtags]
-
-            return hashtags[:5]  # Limit to maximum 5 hashtags
-
-        except Exception as e:
-            logger.error(f"Error generating hashtags: {str(e)}")
-            return []
-        finally:
-            # Clean up temporary files
-            self._cleanup_temp_files()
+        return {
+            'title': str(content.get('title') or 'Untitled Video')[:50],
+            'description': str(content.get('description') or 'No description available')[:150],
+            'hashtags': hashtags[:5]  # Limit to maximum 5 hashtags
+        }
 
     def _save_content(self, content: Dict[str, Any]):
         """Save content to Firestore."""
@@ -281,42 +717,42 @@ class HashtagGenerator:
 
         # Update video document in Firestore
         video_ref = self.db.collection('videos').document(self.video_id)
-        video_ref.update({
-            'title': content.get('title', 'Untitled Video'),
-            'description': content.get('description', ''),
-            'hashtags': content.get('hashtags', []),
-            'hasHashtags': True,
-            'updatedAt': firestore.SERVER_TIMESTAMP
-        })
+        video_ref.update(_content_update(content))
         logger.info(f"Saved content for video {self.video_id} to Firestore")
 
-    def process(self) -> Dict[str, Any]:
-        """Process video and generate content."""
+        # This video no longer belongs in the cached scan results
+        clear_scan_cache()
+
+    def process(self, save: bool = True) -> Dict[str, Any]:
+        """Process video and generate content.
+
+        Args:
+            save: If False, skip the Firestore update and only return the content
+        """
+        return asyncio.run(self.aprocess(save=save))
+
+    async def aprocess(self, save: bool = True, executor: Optional[ThreadPoolExecutor] = None,
+                       extract_executor: Optional[ThreadPoolExecutor] = None) -> Dict[str, Any]:
+        """Process video and generate content on the running event loop.
+
+        Args:
+            save: If False, skip the Firestore update and only return the content
+            executor: Pool for blocking downloads and Firestore writes;
+                defaults to the loop's executor
+            extract_executor: Pool for ffmpeg frame extraction; defaults to
+                the loop's executor
+        """
+        loop = asyncio.get_running_loop()
         try:
-            # Download video
-            video_path = self._download_video()
-
-            # Extract frames
-            frame_urls = self._extract_frames(video_path)
-
-            # Cleanup video file early to save memory
-            os.unlink(video_path)
-
-            # Generate content description
-            content = self._generate_content_description(frame_urls)
-
-            # Generate hashtags
-            hashtags = self._generate_hashtags(frame_urls)
+            # Download video and extract frames
+            frame_urls = await self._load_frames(executor, extract_executor)
 
-            # Combine all content
-            result = {
-                'title': content['title'],
-                'description': content['description'],
-                'hashtags': hashtags
-            }
+            # Generate title, description and hashtags together
+            result = await self._generate_content(frame_urls)
 
             # Save content
-            self._save_content(result)
+            if save:
+                await loop.run_in_executor(executor, self._save_content, result)
 
             return {
                 "success": True,
@@ -328,13 +764,52 @@ class HashtagGenerator:
             error_msg = str(e)
             logger.error(
                 f"Error processing video {self.video_id}: {error_msg}")
-            # Make sure to clean up temp files even on error
-            self._cleanup_temp_files()
             return {
                 "success": False,
                 "videoId": self.video_id,
                 "error": error_msg
             }
+        finally:
+            if self._owns_openai_client:
+                await self.openai_client.close()
+
+
+async def _process_video_async(video_data: Dict[str, Any], semaphore: asyncio.Semaphore,
+                               executor: ThreadPoolExecutor,
+                               extract_executor: ThreadPoolExecutor,
+                               openai_client: AsyncOpenAI) -> Dict[str, Any]:
+    """Process one video without saving, bounded by the shared semaphore."""
+    async with semaphore:
+        try:
+            generator = HashtagGenerator(
+                video_data['id'], video_data, openai_client)
+            return await generator.aprocess(
+                save=False, executor=executor, extract_executor=extract_executor)
+        except Exception as e:
+            logger.error(
+                f"Error processing video {video_data['id']}: {str(e)}")
+            return {
+                "success": False,
+                "videoId": video_data['id'],
+                "error": str(e)
+            }
+
+
+async def _process_videos(videos: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Process videos concurrently on one event loop.
+
+    OpenAI requests overlap up to MAX_CONCURRENT_REQUESTS, downloads stay
+    limited to MAX_WORKERS threads and ffmpeg decodes to EXTRACT_WORKERS.
+    """
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+    # One client per event loop, so every video reuses its connection pool
+    async with AsyncOpenAI(api_key=os.getenv('OPENAI_API_KEY')) as openai_client:
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor, \
+                ThreadPoolExecutor(max_workers=EXTRACT_WORKERS) as extract_executor:
+            return list(await asyncio.gather(
+                *(_process_video_async(video, semaphore, executor,
+                                       extract_executor, openai_client)
+                  for video in videos)))
 
 
 def process_all_videos() -> Dict[str, Any]:
@@ -349,19 +824,11 @@ def process_all_videos() -> Dict[str, Any]:
                 "total": 0
             }
 
-        results = []
-        # Process videos in parallel using ThreadPoolExecutor
-        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-            # Submit all tasks
-            future_to_video = {
-                executor.submit(process_single_video, video): video
-                for video in videos
-            }
+        # Process videos concurrently on an event loop
+        results = asyncio.run(_process_videos(videos))
 
-            # Collect results as they complete
-            for future in as_completed(future_to_video):
-                result = future.result()
-                results.append(result)
+        # Write all generated content in batched commits
+        _save_results(results)
 
         successful = len([r for r in results if r.get('success', False)])
 
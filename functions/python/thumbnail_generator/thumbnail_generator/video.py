@@ -2,34 +2,139 @@
 
 import os
 import logging
+import shutil
 import tempfile
-from io import BytesIO
-from typing import Dict, Any, Optional
-from datetime import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+from datetime import timedelta
 import requests
+from requests.adapters import HTTPAdapter
 from urllib.parse import unquote
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
+# Buffer size for streaming HTTP downloads to disk
+DOWNLOAD_BUFFER_SIZE = 1 << 20  # 1 MiB
+DOWNLOAD_TIMEOUT = (5, 60)  # connect, read seconds
+
 try:
-    # Import numpy first to avoid OpenCV import issues
-    import numpy
-    import cv2
-    from PIL import Image
     from firebase_admin import storage, firestore
+    from google.cloud.exceptions import NotFound
+    from google.cloud.storage.retry import DEFAULT_RETRY
 except ImportError as e:
     logger.error(f"Failed to import required modules: {str(e)}")
     raise
 
+from .frames import generate_thumbnail, video_temp_dir
+
+# Conventional storage locations probed when the recorded paths miss
+STANDARD_PATH_TEMPLATES = (
+    "videos/{}.mp4",
+    "videos/{}",
+    "raw/{}.mp4",
+    "raw/{}",
+    "{}.mp4",
+    "{}",
+)
+
+# Lifetime of the URL ffmpeg streams the video from
+SIGNED_URL_EXPIRATION = timedelta(minutes=5)
+
+# Thumbnail upload deadline; uploads are retried on transient errors
+UPLOAD_TIMEOUT = 30  # seconds
+# Thumbnails are rewritten in place on reprocessing, so keep caches short
+THUMBNAIL_CACHE_CONTROL = 'public, max-age=86400'
+
+# Parallel exists() probes when the recorded paths miss
+PATH_PROBE_WORKERS = 4
+
+# Connections kept open to Cloud Storage; sized for concurrent transfers
+HTTP_POOL_SIZE = 20
+
+_http_pool_configured = False
+
+# Shared session so HTTPS downloads reuse connections across a batch
+_download_session = requests.Session()
+_download_session.mount('https://', HTTPAdapter(pool_connections=HTTP_POOL_SIZE,
+                                                pool_maxsize=HTTP_POOL_SIZE))
+
+
+@lru_cache(maxsize=None)
+def _storage_bucket(name: Optional[str] = None):
+    """Return a storage bucket whose client reuses a widened connection pool.
+
+    firebase_admin caches one storage client per app, so mounting the adapter
+    once lets every download and upload share the same keep-alive sessions.
+    The client's session is private, so when it is missing or is not a
+    requests session the client keeps its default pool. Handles are cached
+    per bucket name.
+    """
+    global _http_pool_configured
+    bucket = storage.bucket(name)
+    if not _http_pool_configured:
+        http = getattr(bucket.client, '_http', None)
+        if hasattr(http, 'mount'):
+            http.mount('https://', HTTPAdapter(pool_connections=HTTP_POOL_SIZE,
+                                               pool_maxsize=HTTP_POOL_SIZE))
+        else:
+            logger.info("Storage client has no mountable session; using its default pool")
+        _http_pool_configured = True
+    return bucket
+
+
+@lru_cache(maxsize=1)
+def _db():
+    """Return the shared Firestore client."""
+    return firestore.client()
+
+
+# Statuses that still need a thumbnail, and documents fetched per query page
+PENDING_STATUSES = ['pending', 'failed']
+VIDEO_QUERY_PAGE_SIZE = 500
+# The backlog scan reads every video document, so it projects only the fields
+# the predicate and VideoProcessor need; the rest of each document is not sent
+VIDEO_QUERY_FIELDS = ['storagePath', 'storageUrl', 'thumbnailUrl',
+                      'processingStatus']
+
+# Videos processed concurrently by process_all
+BATCH_WORKERS = os.cpu_count() or 1
+BULK_WRITE_MAX_ATTEMPTS = 5  # Tries per BulkWriter update before giving up
+
+# Deadline for a single video's metadata write outside process_all
+WRITE_TIMEOUT = 30  # seconds
+
+
+def _set_merged(video_ref, update_data: Dict[str, Any]) -> None:
+    """Write a merged Firestore update, raising if it does not land.
+
+    Merging on the top-level field names replaces each written field whole,
+    so a reprocess drops stale keys from the metadata map, while a missing
+    document is still created.
+    """
+    video_ref.set(update_data, merge=list(update_data), timeout=WRITE_TIMEOUT)
+
 
 class VideoProcessor:
     """Video processing class for thumbnail generation."""
 
-    def __init__(self, video_id: str, video_data: Dict[str, Any]):
-        """Initialize video processor."""
+    def __init__(self, video_id: str, video_data: Dict[str, Any], db=None, bucket=None,
+                 write: Optional[Callable[[Any, Dict[str, Any]], None]] = None):
+        """Initialize video processor.
+
+        Args:
+            db: Firestore client; defaults to the shared client
+            bucket: Default storage bucket; defaults to the shared handle
+            write: Writes a metadata update; defaults to a blocking merged
+                set, so a failed write surfaces as an error result
+        """
         self.video_id = video_id
         self.video_data = video_data
+        self.db = db or _db()
+        self.bucket = bucket or _storage_bucket()
+        self.write = write or _set_merged
         self.temp_file: Optional[str] = None
 
     def __enter__(self):
@@ -48,43 +153,67 @@ class VideoProcessor:
                 logger.info(f"Cleaned up temp file: {self.temp_file}")
             except Exception as e:
                 logger.warning(f"Failed to clean up temp file: {str(e)}")
-
-    def extract_dimensions(self) -> Dict[str, int]:
-        """Extract dimensions from video file."""
-        if not self.temp_file:
+        self.temp_file = None
+
+    def _temp_path(self) -> str:
+        """Return this processor's download file, creating it on first use.
+
+        Every download attempt overwrites the same file, so a process() that
+        falls through several sources creates one temp file, not one each.
+        """
+        if self.temp_file is None:
+            fd, self.temp_file = tempfile.mkstemp(suffix='.mp4', dir=video_temp_dir())
+            os.close(fd)
+        return self.temp_file
+
+    def generate_thumbnail(self, source: Optional[str] = None) -> Tuple[Dict[str, Any], bytes]:
+        """Return the video dimensions and a JPEG thumbnail.
+
+        Args:
+            source: Local path or URL to read; defaults to the downloaded file
+        """
+        source = source or self.temp_file
+        if not source:
             raise ValueError("No video file loaded")
+        return generate_thumbnail(source)
 
+    def _stream_url(self) -> Optional[str]:
+        """Return a URL ffmpeg can read the video from, signing Storage paths."""
         try:
-            cap = cv2.VideoCapture(self.temp_file)
-            width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-            height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-            fps = int(cap.get(cv2.CAP_PROP_FPS))
-            cap.release()
-            return {"width": width, "height": height, "fps": fps}
+            if storage_path := self.video_data.get('storagePath'):
+                blob = self.bucket.blob(storage_path)
+            else:
+                storage_url = self.video_data.get('storageUrl', '')
+                if storage_url.startswith('https://'):
+                    return storage_url
+                if not storage_url.startswith('gs://'):
+                    return None
+                bucket_name, _, path = storage_url[len('gs://'):].partition('/')
+                blob = _storage_bucket(bucket_name).blob(path)
+
+            return blob.generate_signed_url(
+                version='v4', expiration=SIGNED_URL_EXPIRATION)
         except Exception as e:
-            logger.error(f"Error extracting dimensions: {str(e)}")
-            return {}
+            logger.warning(f"Could not sign video URL: {str(e)}")
+            return None
 
-    def generate_thumbnail(self) -> bytes:
-        """Generate thumbnail from video file."""
-        if not self.temp_file:
-            raise ValueError("No video file loaded")
+    def stream_thumbnail(self) -> Optional[Tuple[Dict[str, Any], bytes]]:
+        """Generate the thumbnail from the remote video without downloading it.
+
+        ffmpeg range-requests the container index and the frames it decodes,
+        so the rest of the file is never transferred. Returns None when the
+        URL cannot be signed or decoded so the caller can download instead.
+        """
+        url = self._stream_url()
+        if not url:
+            return None
 
         try:
-            cap = cv2.VideoCapture(self.temp_file)
-            success, frame = cap.read()
-            if not success:
-                raise ValueError("Could not read video frame")
-
-            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            image = Image.fromarray(rgb_frame)
-            img_byte_arr = BytesIO()
-            image.save(img_byte_arr, format='JPEG', quality=85)
-            cap.release()
-            return img_byte_arr.getvalue()
+            return self.generate_thumbnail(url)
         except Exception as e:
-            logger.error(f"Error generating thumbnail: {str(e)}")
-            raise
+            logger.warning(
+                f"Streaming thumbnail failed, downloading instead: {str(e)}")
+            return None
 
     def get_possible_paths(self) -> list[str]:
         """Get all possible paths where the video might be stored."""
@@ -106,78 +235,109 @@ class VideoProcessor:
                 possible_paths.append(path)
 
         # 3. Try standard paths
-        standard_paths = [
-            f"videos/{self.video_id}.mp4",
-            f"videos/{self.video_id}",
-            f"raw/{self.video_id}.mp4",
-            f"raw/{self.video_id}",
-            f"{self.video_id}.mp4",
-            self.video_id
-        ]
-
-        possible_paths.extend(
-            path for path in standard_paths if path not in possible_paths)
-        return possible_paths
+        possible_paths.extend(template.format(self.video_id)
+                              for template in STANDARD_PATH_TEMPLATES)
+
+        # Order-preserving dedup
+        return list(dict.fromkeys(possible_paths))
+
+    def find_existing_path(self, candidates: list[str]) -> Optional[str]:
+        """Return the first candidate path that exists in the bucket.
+
+        The exists() probes run in parallel, so a miss costs one round-trip
+        instead of one per candidate.
+        """
+        if not candidates:
+            return None
+
+        bucket = self.bucket
+
+        def exists(path: str) -> bool:
+            try:
+                return bucket.blob(path).exists()
+            except Exception as e:
+                logger.warning(f"Error probing path {path}: {str(e)}")
+                return False
+
+        with ThreadPoolExecutor(max_workers=min(PATH_PROBE_WORKERS, len(candidates))) as probe:
+            found = list(probe.map(exists, candidates))
+        return next((path for path, hit in zip(candidates, found) if hit), None)
 
     def download_from_url(self, url: str) -> bool:
         """Download video from URL to temporary file."""
         try:
-            _, self.temp_file = tempfile.mkstemp(suffix='.mp4')
+            temp_file = self._temp_path()
 
             if url.startswith('gs://'):
                 bucket_name = url.split('/')[2]
                 path = '/'.join(url.split('/')[3:])
-                bucket = storage.bucket(bucket_name)
+                bucket = _storage_bucket(bucket_name)
                 blob = bucket.blob(path)
 
-                if blob.exists():
-                    blob.download_to_filename(self.temp_file)
-                    return True
-            else:
-                response = requests.get(url, stream=True)
-                if response.status_code == 200:
-                    with open(self.temp_file, 'wb') as f:
-                        for chunk in response.iter_content(chunk_size=8192):
-                            f.write(chunk)
-                    return True
+                # A missing object surfaces as NotFound; no exists() round trip
+                blob.download_to_filename(temp_file)
+                return True
 
+            # Closing the response returns its connection to the pool even
+            # when the body is never read
+            with _download_session.get(
+                    url, stream=True, timeout=DOWNLOAD_TIMEOUT) as response:
+                if response.status_code != 200:
+                    return False
+                # Copy the raw stream in C instead of looping over chunks
+                response.raw.decode_content = True
+                with open(temp_file, 'wb') as f:
+                    shutil.copyfileobj(
+                        response.raw, f, length=DOWNLOAD_BUFFER_SIZE)
+            return True
+        except NotFound:
             return False
         except Exception as e:
             logger.error(f"Error downloading from URL: {str(e)}")
-            self.cleanup()
             return False
 
     def download_from_storage(self, path: str) -> bool:
         """Download video from Firebase Storage."""
         try:
-            bucket = storage.bucket()
+            bucket = self.bucket
             blob = bucket.blob(path)
 
-            if blob.exists():
-                _, self.temp_file = tempfile.mkstemp(suffix='.mp4')
-                blob.download_to_filename(self.temp_file)
-                return True
-
+            # Download without an exists() probe; a missing object costs
+            # the same single request and surfaces as NotFound
+            blob.download_to_filename(self._temp_path())
+            return True
+        except NotFound:
             return False
         except Exception as e:
             logger.error(f"Error downloading from storage: {str(e)}")
-            self.cleanup()
             return False
 
     def process(self) -> Dict[str, Any]:
         """Process video to generate thumbnail and extract metadata."""
         try:
-            # Try direct URL download first
+            storage_path = self.video_data.get('storagePath')
+
+            # Fastest path: decode straight from Storage without a download
+            if thumbnail := self.stream_thumbnail():
+                return self._process_loaded_video(storage_path or '', thumbnail)
+
+            # Fast path: the recorded storagePath is almost always correct
+            if storage_path and self.download_from_storage(storage_path):
+                return self._process_loaded_video(storage_path)
+
+            # Try direct URL download next
             if storage_url := self.video_data.get('storageUrl'):
                 if self.download_from_url(storage_url):
-                    return self._process_loaded_video(self.video_data.get('storagePath', ''))
+                    return self._process_loaded_video(storage_path or '')
 
-            # Try all possible storage paths
-            for path in self.get_possible_paths():
-                if self.download_from_storage(path):
-                    return self._process_loaded_video(path)
+            # Only then probe the remaining candidate paths, all at once
+            possible_paths = self.get_possible_paths()
+            candidates = [path for path in possible_paths if path != storage_path]
+            path = self.find_existing_path(candidates)
+            if path and self.download_from_storage(path):
+                return self._process_loaded_video(path)
 
-            error_msg = f"Video not found. Tried paths: {', '.join(self.get_possible_paths())}"
+            error_msg = f"Video not found. Tried paths: {', '.join(possible_paths)}"
             logger.error(error_msg)
             return {"error": error_msg, "videoId": self.video_id}
 
@@ -187,22 +347,23 @@ class VideoProcessor:
             self._update_processing_status('failed', error_msg)
             return {"error": error_msg, "videoId": self.video_id}
 
-    def _process_loaded_video(self, video_path: str) -> Dict[str, Any]:
-        """Process already loaded video file."""
+    def _process_loaded_video(self, video_path: str,
+                              thumbnail: Optional[Tuple[Dict[str, Any], bytes]] = None) -> Dict[str, Any]:
+        """Process already loaded video file, or a thumbnail already streamed."""
         try:
-            # Extract dimensions
-            dimensions = self.extract_dimensions()
-
-            # Generate thumbnail
-            thumbnail_data = self.generate_thumbnail()
+            dimensions, thumbnail_data = thumbnail or self.generate_thumbnail()
 
             # Upload thumbnail
             thumbnail_path = f"thumbnails/{self.video_id}.jpg"
-            bucket = storage.bucket()
+            bucket = self.bucket
             thumbnail_blob = bucket.blob(thumbnail_path)
+            thumbnail_blob.cache_control = THUMBNAIL_CACHE_CONTROL
             thumbnail_blob.upload_from_string(
                 thumbnail_data,
-                content_type='image/jpeg'
+                content_type='image/jpeg',
+                timeout=UPLOAD_TIMEOUT,
+                retry=DEFAULT_RETRY,
+                checksum='crc32c'
             )
 
             # Update video metadata
@@ -211,12 +372,11 @@ class VideoProcessor:
                 'thumbnailUrl': f"gs://{bucket.name}/{thumbnail_path}",
                 'processingStatus': 'completed',
                 'storagePath': video_path,
-                'updatedAt': datetime.now()
+                'updatedAt': firestore.SERVER_TIMESTAMP
             }
 
-            db = firestore.client()
-            video_ref = db.collection('videos').document(self.video_id)
-            video_ref.update(update_data)
+            video_ref = self.db.collection('videos').document(self.video_id)
+            self.write(video_ref, update_data)
 
             return {
                 "success": True,
@@ -233,70 +393,137 @@ class VideoProcessor:
             return {"error": error_msg, "videoId": self.video_id}
 
     def _update_processing_status(self, status: str, error_msg: str = '') -> None:
-        """Update video processing status in Firestore."""
+        """Write the processing status through the same writer as the metadata."""
         try:
-            db = firestore.client()
-            video_ref = db.collection('videos').document(self.video_id)
+            video_ref = self.db.collection('videos').document(self.video_id)
             update_data = {
                 'processingStatus': status,
-                'updatedAt': datetime.now()
+                'updatedAt': firestore.SERVER_TIMESTAMP
             }
             if error_msg:
                 update_data['processingError'] = error_msg
-            video_ref.update(update_data)
+            self.write(video_ref, update_data)
         except Exception as e:
             logger.error(f"Error updating processing status: {str(e)}")
 
 
+def _process_one(video_data: Dict[str, Any], write) -> Dict[str, Any]:
+    """Process a single video for process_all, turning errors into results."""
+    video_id = video_data['id']
+    logger.info(f"Processing video {video_id}")
+    try:
+        with VideoProcessor(video_id, video_data, write=write) as processor:
+            result = processor.process()
+            logger.debug("Processed video %s: %s", video_id, result)
+            return result
+    except Exception as e:
+        error_msg = f"Error processing video {video_id}: {str(e)}"
+        logger.error(error_msg)
+        return {"error": error_msg, "videoId": video_id}
+
+
+def process_all(videos: list[Dict[str, Any]]) -> list[Dict[str, Any]]:
+    """Process videos concurrently, returning results in input order.
+
+    Each job spends its time in ffmpeg subprocesses, OpenCV decode and
+    Storage transfers, all of which release the GIL, so threads scale with
+    the CPU count and share the Firebase clients.
+
+    Metadata and failure-status writes go through one BulkWriter, which
+    batches and parallelizes the RPCs and retries failed writes with
+    backoff. Results whose update still fails are marked as failed.
+    """
+    bulk_writer = _db().bulk_writer()
+    bulk_writer_lock = threading.Lock()
+    failed_writes: Dict[str, str] = {}
+
+    def on_write_error(error, _writer) -> bool:
+        if error.attempts < BULK_WRITE_MAX_ATTEMPTS:
+            return True
+        logger.error(
+            f"Error writing metadata for video {error.reference.id}: {error.message}")
+        failed_writes[error.reference.id] = error.message
+        return False
+
+    def write(video_ref, update_data: Dict[str, Any]) -> None:
+        # BulkWriter is not documented as thread-safe; enqueueing is cheap
+        with bulk_writer_lock:
+            bulk_writer.set(video_ref, update_data, merge=list(update_data))
+
+    bulk_writer.on_write_error(on_write_error)
+    with ThreadPoolExecutor(max_workers=min(BATCH_WORKERS, len(videos) or 1)) as executor:
+        results = list(executor.map(lambda video: _process_one(video, write), videos))
+    # Blocks until every queued update has been written or given up on
+    bulk_writer.close()
+
+    for result in results:
+        if result.get('success') and result['videoId'] in failed_writes:
+            result['success'] = False
+            result['error'] = failed_writes[result['videoId']]
+    return results
+
+
+def _page_query(query, page_size: int) -> Iterator[Any]:
+    """Stream a query page by page, resuming after the last document."""
+    query = query.order_by('__name__').limit(page_size)
+    last_doc = None
+    while True:
+        page = query.start_after(last_doc) if last_doc else query
+        docs = list(page.stream())
+        yield from docs
+
+        if len(docs) < page_size:
+            return
+        last_doc = docs[-1]
+
+
+def _needs_thumbnail(video_data: Dict[str, Any]) -> bool:
+    """Return True for pending, failed, unstatused or thumbnail-less videos."""
+    status = video_data.get('processingStatus')
+    return (status is None or status in PENDING_STATUSES
+            or not video_data.get('thumbnailUrl'))
+
+
+def iter_videos_without_thumbnails(page_size: int = VIDEO_QUERY_PAGE_SIZE) -> Iterator[Dict[str, Any]]:
+    """Yield videos that still need a thumbnail, one page at a time.
+
+    Firestore cannot match a missing field, and some writers create video
+    documents without processingStatus (populateFirestoreFromStorage, the
+    hashtag generator's storage sync). A single projected scan therefore
+    reads every video and applies the whole predicate client-side.
+    """
+    videos = _db().collection('videos').select(VIDEO_QUERY_FIELDS)
+    for doc in _page_query(videos, page_size):
+        video_data = doc.to_dict() or {}
+        if _needs_thumbnail(video_data):
+            video_data['id'] = doc.id
+            yield video_data
+
+
 def get_videos_without_thumbnails() -> list[Dict[str, Any]]:
     """Get all videos that don't have thumbnails."""
     try:
-        db = firestore.client()
-        videos_ref = db.collection('videos')
-
         logger.info("Querying for videos without thumbnails...")
 
-        # Simple query to get all videos first
-        all_videos = list(videos_ref.get())
-        logger.info(f"Found {len(all_videos)} total videos")
-
+        total_videos = 0
         results = []
-        for video in all_videos:
-            video_data = video.to_dict()
-            video_data['id'] = video.id
-
-            # Log raw video data for debugging
-            logger.info(f"\nChecking video {video_data['id']}:")
-            logger.info(f"All fields: {sorted(list(video_data.keys()))}")
-            logger.info(f"Raw data: {video_data}")
+        for video_data in iter_videos_without_thumbnails():
+            total_videos += 1
 
-            # Check if this video needs thumbnail processing
-            needs_thumbnail = False
-            reason = None
+            # Per-document details only at debug level; each info line is a
+            # Cloud Logging entry
+            logger.debug("Checking video %s: %s", video_data['id'], video_data)
 
-            # 1. Check if video has a storage path
+            # Check if video has a storage path
             if not video_data.get('storagePath'):
-                logger.info(f"Skipping {video_data['id']} - no storagePath")
+                logger.debug("Skipping %s - no storagePath", video_data['id'])
                 continue
 
-            # 2. Check if video already has a thumbnail
-            if not video_data.get('thumbnailUrl'):
-                needs_thumbnail = True
-                reason = "no thumbnailUrl"
-
-            # 3. Check processing status
-            status = video_data.get('processingStatus')
-            if status in ['pending', 'failed'] or status is None:
-                needs_thumbnail = True
-                reason = f"status is {status}"
-
-            if needs_thumbnail:
-                logger.info(
-                    f"Adding video {video_data['id']} to queue - {reason}")
-                results.append(video_data)
-            else:
-                logger.info(
-                    f"Skipping video {video_data['id']} - already has thumbnail")
+            logger.debug("Adding video %s to queue - status is %s",
+                         video_data['id'], video_data.get('processingStatus'))
+            results.append(video_data)
+
+        logger.info(f"Found {total_videos} videos without a completed thumbnail")
 
         if not results:
             logger.info("\nNo videos need thumbnail generation")
@@ -304,14 +531,13 @@ def get_videos_without_thumbnails() -> list[Dict[str, Any]]:
             logger.info("1. Already have thumbnails")
             logger.info("2. Don't have required storagePath")
         else:
-            logger.info(f"\nFound {len(results)} videos to process:")
+            logger.info(f"\nFound {len(results)} videos to process")
+        if results and logger.isEnabledFor(logging.DEBUG):
             for video in results:
-                logger.info(f"- {video['id']}")
-                logger.info(f"  Storage path: {video.get('storagePath')}")
-                logger.info(
-                    f"  Current thumbnail: {video.get('thumbnailUrl', 'none')}")
-                logger.info(
-                    f"  Processing status: {video.get('processingStatus', 'none')}")
+                logger.debug("- %s (storage path: %s, thumbnail: %s, status: %s)",
+                             video['id'], video.get('storagePath'),
+                             video.get('thumbnailUrl', 'none'),
+                             video.get('processingStatus', 'none'))
 
         return results
 
@@ -1,15 +1,16 @@
 """Thumbnail generator module for video content."""
 
 import os
-from typing import Dict, Any
-import cv2
-import numpy as np
-from PIL import Image
-from io import BytesIO
+from datetime import timedelta
+from typing import Dict, Any, Optional, Tuple
 import tempfile
+from functools import lru_cache
 from firebase_admin import storage, firestore
+from google.cloud.storage.retry import DEFAULT_RETRY
 import logging
 
+from thumbnail_generator.frames import generate_thumbnail, video_temp_dir
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -17,46 +18,98 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Lifetime of the URL ffmpeg streams the video from
+SIGNED_URL_EXPIRATION = timedelta(minutes=5)
 
-def extract_dimensions_from_video(video_path: str) -> Dict[str, int]:
-    """Extract width and height from video file."""
-    try:
-        cap = cv2.VideoCapture(video_path)
-        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-        fps = int(cap.get(cv2.CAP_PROP_FPS))
-        cap.release()
-        return {"width": width, "height": height, "fps": fps}
-    except Exception as e:
-        logger.error(f"Error extracting dimensions: {str(e)}")
-        return {}
+# Thumbnail upload deadline; uploads are retried on transient errors
+UPLOAD_TIMEOUT = 30  # seconds
+# Thumbnails are rewritten in place on reprocessing, so keep caches short
+THUMBNAIL_CACHE_CONTROL = 'public, max-age=86400'
 
 
-def generate_thumbnail(video_path: str) -> bytes:
-    """Generate thumbnail from video file."""
-    try:
-        cap = cv2.VideoCapture(video_path)
+@lru_cache(maxsize=1)
+def _bucket():
+    """Return the shared default storage bucket handle."""
+    return storage.bucket()
 
-        # Read first frame
-        success, frame = cap.read()
-        if not success:
-            raise ValueError("Could not read video frame")
 
-        # Convert BGR to RGB
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+@lru_cache(maxsize=1)
+def _db():
+    """Return the shared Firestore client."""
+    return firestore.client()
 
-        # Convert to PIL Image
-        image = Image.fromarray(rgb_frame)
 
-        # Save to bytes
-        img_byte_arr = BytesIO()
-        image.save(img_byte_arr, format='JPEG', quality=85)
+def stream_thumbnail(blob) -> Optional[Tuple[Dict[str, Any], bytes]]:
+    """Generate the thumbnail from a signed URL without downloading the video.
 
-        cap.release()
-        return img_byte_arr.getvalue()
+    ffmpeg range-requests the container index and the frames it decodes, so
+    the rest of the file is never transferred. Returns None when signing or
+    remote decoding fails so the caller can download the video instead.
+    """
+    try:
+        url = blob.generate_signed_url(
+            version='v4', expiration=SIGNED_URL_EXPIRATION)
+        return generate_thumbnail(url)
     except Exception as e:
-        logger.error(f"Error generating thumbnail: {str(e)}")
-        raise
+        logger.warning(
+            f"Streaming thumbnail failed, downloading instead: {str(e)}")
+        return None
+
+
+def download_thumbnail(blob) -> Tuple[Dict[str, Any], bytes]:
+    """Download the video to a temp file and generate the thumbnail from it."""
+    logger.info("Downloading video to temp file...")
+    fd, temp_local_filename = tempfile.mkstemp(dir=video_temp_dir())
+    os.close(fd)
+    try:
+        blob.download_to_filename(temp_local_filename)
+        logger.info(
+            f"Video downloaded to temporary file: {temp_local_filename}")
+        return generate_thumbnail(temp_local_filename)
+    finally:
+        # Clean up temp file
+        if os.path.exists(temp_local_filename):
+            os.remove(temp_local_filename)
+            logger.info("Temporary file cleaned up")
+
+
+def _finish(bucket, video_id: str, dimensions: Dict[str, Any], thumbnail_data: bytes) -> str:
+    """Upload the thumbnail and record it on the video document.
+
+    The document is only updated after the upload succeeds, so it never
+    points at a thumbnail that does not exist.
+    """
+    thumbnail_path = f"thumbnails/{video_id}.jpg"
+    logger.info(f"Uploading thumbnail to: {thumbnail_path}")
+    thumbnail_blob = bucket.blob(thumbnail_path)
+    thumbnail_blob.cache_control = THUMBNAIL_CACHE_CONTROL
+    thumbnail_blob.upload_from_string(
+        thumbnail_data,
+        content_type='image/jpeg',
+        timeout=UPLOAD_TIMEOUT,
+        retry=DEFAULT_RETRY,
+        checksum='crc32c'
+    )
+    logger.info("Thumbnail uploaded successfully")
+
+    # Update video metadata in Firestore
+    if dimensions:
+        logger.info("Updating video metadata in Firestore...")
+        video_ref = _db().collection('videos').document(video_id)
+        video_ref.update({
+            'metadata': {
+                'width': dimensions['width'],
+                'height': dimensions['height'],
+                'fps': dimensions['fps']
+            },
+            'thumbnailUrl': f"gs://{bucket.name}/{thumbnail_path}",
+            'thumbnailPath': thumbnail_path,
+            'processingStatus': 'completed',
+            'updatedAt': firestore.SERVER_TIMESTAMP
+        })
+        logger.info("Firestore metadata updated successfully")
+
+    return thumbnail_path
 
 
 def process_video(request_data: Dict[str, Any]) -> Dict[str, Any]:
@@ -74,7 +127,7 @@ def process_video(request_data: Dict[str, Any]) -> Dict[str, Any]:
         logger.info(f"Processing video: {video_path} (ID: {video_id})")
 
         # Get video from storage
-        bucket = storage.bucket()
+        bucket = _bucket()
         logger.info(f"Accessing bucket: {bucket.name}")
 
         video_blob = bucket.blob(video_path)
@@ -84,65 +137,21 @@ def process_video(request_data: Dict[str, Any]) -> Dict[str, Any]:
             logger.error(f"Video not found in storage: {video_path}")
             return {"error": "Video not found"}
 
-        logger.info("Video found in storage, downloading to temp file...")
+        # Decode from a signed URL first; the download is the fallback
+        logger.info("Generating thumbnail...")
+        dimensions, thumbnail_data = (stream_thumbnail(video_blob)
+                                      or download_thumbnail(video_blob))
+        logger.info(f"Video dimensions: {dimensions}")
+        logger.info("Thumbnail generated successfully")
 
-        # Download to temp file
-        _, temp_local_filename = tempfile.mkstemp()
-        video_blob.download_to_filename(temp_local_filename)
-        logger.info(
-            f"Video downloaded to temporary file: {temp_local_filename}")
+        thumbnail_path = _finish(bucket, video_id, dimensions, thumbnail_data)
 
-        try:
-            # Extract dimensions
-            logger.info("Extracting video dimensions...")
-            dimensions = extract_dimensions_from_video(temp_local_filename)
-            logger.info(f"Video dimensions: {dimensions}")
-
-            # Generate thumbnail
-            logger.info("Generating thumbnail...")
-            thumbnail_data = generate_thumbnail(temp_local_filename)
-            logger.info("Thumbnail generated successfully")
-
-            # Upload thumbnail to thumbnails/ directory
-            thumbnail_path = f"thumbnails/{video_id}.jpg"
-            logger.info(f"Uploading thumbnail to: {thumbnail_path}")
-            thumbnail_blob = bucket.blob(thumbnail_path)
-            thumbnail_blob.upload_from_string(
-                thumbnail_data,
-                content_type='image/jpeg'
-            )
-            logger.info("Thumbnail uploaded successfully")
-
-            # Update video metadata in Firestore
-            if dimensions:
-                logger.info("Updating video metadata in Firestore...")
-                db = firestore.client()
-                video_ref = db.collection('videos').document(video_id)
-                video_ref.update({
-                    'metadata': {
-                        'width': dimensions['width'],
-                        'height': dimensions['height'],
-                        'fps': dimensions['fps']
-                    },
-                    'thumbnailUrl': f"gs://{bucket.name}/{thumbnail_path}",
-                    'thumbnailPath': thumbnail_path,
-                    'processingStatus': 'completed',
-                    'updatedAt': firestore.SERVER_TIMESTAMP
-                })
-                logger.info("Firestore metadata updated successfully")
-
-            return {
-                "success": True,
-                "videoId": video_id,
-                "thumbnailPath": thumbnail_path,
-                "dimensions": dimensions
-            }
-
-        finally:
-            # Clean up temp file
-            if os.path.exists(temp_local_filename):
-                os.remove(temp_local_filename)
-                logger.info("Temporary file cleaned up")
+        return {
+            "success": True,
+            "videoId": video_id,
+            "thumbnailPath": thumbnail_path,
+            "dimensions": dimensions
+        }
 
     except Exception as e:
         error_msg = str(e)
@@ -150,7 +159,7 @@ def process_video(request_data: Dict[str, Any]) -> Dict[str, Any]:
 
         # Update error status in Firestore
         try:
-            db = firestore.client()
+            db = _db()
             video_ref = db.collection('videos').document(video_id)
             video_ref.update({
                 'processingStatus': 'failed',
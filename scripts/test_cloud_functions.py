@@ -3,10 +3,17 @@
 import os
 import sys
 import argparse
+import hashlib
+import shutil
 import subprocess
 from pathlib import Path
 from dotenv import load_dotenv
 
+# Installed alongside requirements.txt for running the function locally
+DEV_PACKAGES = ['functions-framework', 'python-dotenv']
+# Digest of the last installed requirements, kept inside the venv
+REQUIREMENTS_SENTINEL = os.path.join('venv', '.req.sha256')
+
 
 def setup_environment():
     """Set up the environment variables needed for testing."""
@@ -26,6 +33,29 @@ def setup_environment():
     os.environ['FUNCTION_TARGET'] = 'analyze_screenshot'
 
 
+def install_dependencies(venv_python: str):
+    """Install requirements into the venv, skipping unchanged requirements."""
+    digest = hashlib.sha256(Path('requirements.txt').read_bytes())
+    digest.update(' '.join(DEV_PACKAGES).encode())
+    digest = digest.hexdigest()
+
+    sentinel = Path(REQUIREMENTS_SENTINEL)
+    if sentinel.exists() and sentinel.read_text() == digest:
+        print("Dependencies up to date, skipping install")
+        return
+
+    # uv resolves and installs much faster than pip and has its own cache
+    if shutil.which('uv'):
+        install = ['uv', 'pip', 'install', '--python', venv_python]
+    else:
+        install = [venv_python, '-m', 'pip', 'install']
+
+    print("Installing dependencies...")
+    subprocess.run(install + ['-r', 'requirements.txt'] + DEV_PACKAGES,
+                   check=True)
+    sentinel.write_text(digest)
+
+
 def start_functions_framework(function_name: str, port: int = 8080, no_browser: bool = False):
     """Start the Functions Framework server."""
     function_dir = Path(__file__).parent.parent / \
@@ -46,15 +76,7 @@ def start_functions_framework(function_name: str, port: int = 8080, no_browser:
         # Activate virtual environment and install dependencies
         venv_python = os.path.join('venv', 'bin', 'python')
 
-        print("Installing dependencies...")
-        subprocess.run([venv_python, '-m', 'pip', 'install',
-                       '-r', 'requirements.txt'], check=True)
-
-        # Install additional development dependencies
-        print("Installing development dependencies...")
-        for package in ['functions-framework', 'python-dotenv']:
-            subprocess.run([venv_python, '-m', 'pip',
-                           'install', package], check=True)
+        install_dependencies(venv_python)
 
         # Set PYTHONPATH to include the function directory
         os.environ['PYTHONPATH'] = str(function_dir)
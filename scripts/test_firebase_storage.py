@@ -15,6 +15,11 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+VIDEO_PREFIX = 'videos/'  # Folder the app uploads videos to
+# Every blob property this script reads, so listing needs no per-blob reload
+VIDEO_LIST_FIELDS = ('items(name,size,contentType,updated,metadata,'
+                     'timeCreated,storageClass),nextPageToken')
+
 
 def init_firebase():
     """Initialize Firebase Admin SDK."""
@@ -37,8 +42,16 @@ def list_storage_videos(bucket):
     """List all videos in storage bucket."""
     try:
         logger.info("Listing videos in storage...")
-        # List all blobs in root
-        blobs = bucket.list_blobs()
+        # Let the server filter to the uploads folder instead of paging
+        # through the whole bucket
+        try:
+            blobs = bucket.list_blobs(prefix=VIDEO_PREFIX,
+                                      match_glob=f"{VIDEO_PREFIX}**.mp4",
+                                      fields=VIDEO_LIST_FIELDS)
+        except TypeError:
+            # google-cloud-storage < 2.10 has no match_glob
+            blobs = bucket.list_blobs(prefix=VIDEO_PREFIX,
+                                      fields=VIDEO_LIST_FIELDS)
 
         # Filter for video files
         video_blobs = [blob for blob in blobs if blob.name.endswith('.mp4')]
@@ -71,8 +84,8 @@ def list_storage_videos(bucket):
 def check_video_metadata(bucket, blob):
     """Check metadata for a video."""
     try:
+        # Properties come from the list response; no reload() round trip
         logger.info(f"\nChecking metadata for {blob.name}:")
-        blob.reload()  # Refresh metadata
 
         # Log all metadata
         logger.info("Metadata:")